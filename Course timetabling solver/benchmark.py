@@ -0,0 +1,253 @@
+""" Curriculum-based course timetabling solver;
+    solves timetabling problems formulated in .ectt file format (http://tabu.diegm.uniud.it/ctt/)
+    Copyright (C) 2013  Stephan E. Becker
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+__author__ = 'Stephan Becker'
+
+# benchmark runner: solves instances with several seeds and configurations, writes one JSON line per run
+# and compares the results against a baseline, e.g.
+#   python benchmark.py run --instances "comp0*.ectt" --seeds 0 1 2 --time-limit 10 60 \
+#       --config default --config bts:improveType=BTS --workers 4 --output results.jsonl
+#   python benchmark.py compare results.jsonl baseline.jsonl
+
+import os
+import sys
+import ast
+import glob
+import json
+import datetime
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import initialisation
+import data
+import solver
+import validator
+
+
+def parseConfig(config):
+    """
+    parses a configuration "name:setting=value,setting=value" of settings of initialisation;
+    a configuration without settings ("default") runs the solver as it is configured.
+    the values are Python literals (10, 0.5, True, None, "TS"); any other value is taken as a string
+
+    returns the name and a dict of the settings
+    """
+    name, _, settings = config.partition(":")
+    overrides = {}
+    for setting in filter(None, settings.split(",")):
+        key, _, value = setting.partition("=")
+        if not hasattr(initialisation, key):
+            raise ValueError("unknown setting in configuration {}: {}".format(name, key))
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+        overrides[key] = value
+    return name, overrides
+
+
+def instanceFiles(patterns):
+    """
+    returns the sorted .ectt files matching the patterns; a pattern without a folder refers to the datasets folder
+    """
+    files = set()
+    for pattern in patterns:
+        if not os.path.dirname(pattern):
+            pattern = os.path.join(data.datasets_dir, pattern)
+        matches = glob.glob(pattern)
+        if not matches:
+            raise ValueError("no instance matches " + pattern)
+        files.update(matches)
+    return sorted(files)
+
+
+def runBenchmark(input_file, config, overrides, seed, time_limit):
+    """
+    one run of the solver with the settings of the configuration, which are restored afterwards;
+    the best timetable is validated
+
+    returns the record of the run
+    """
+    defaults = {key: getattr(initialisation, key) for key in overrides}
+    for key, value in overrides.items():
+        setattr(initialisation, key, value)
+    try:
+        result = solver.Solver(data.loadInstance(input_file)).solve(time_limit, seed)
+    finally:
+        for key, value in defaults.items():
+            setattr(initialisation, key, value)
+    report, violations, totalCost = validator.validate(result.best_tt)
+
+    time_to_feasibility = None
+    if result.best_distance == 0:
+        time_to_feasibility = result.construction_time + result.feasibility_time
+
+    return {"instance": os.path.basename(input_file),
+            "config": config,
+            "settings": overrides,
+            "seed": seed,
+            "time_limit": time_limit,
+            "hard": violations,
+            "soft": totalCost,
+            "best_distance": result.best_distance,
+            "time_to_feasibility": time_to_feasibility,
+            "time_to_best": result.time_to_best,
+            "moves": result.moves,
+            "moves_per_second": result.moves / result.improvement_time if result.improvement_time > 0 else 0,
+            "construction_time": result.construction_time,
+            "feasibility_time": result.feasibility_time,
+            "improvement_time": result.improvement_time,
+            "statistics": result.statistics,
+            "date": str(datetime.datetime.today())}
+
+
+def runBenchmarks(input_files, configs, seeds, time_limits, workers=1, output=None):
+    """
+    runs every configuration with every seed and every time limit on every instance,
+    in a pool of worker processes if workers > 1;
+    each record is appended to the output file as soon as its run has finished
+
+    returns the records of all runs
+    """
+    runs = [(input_file, name, overrides, seed, time_limit) for input_file in input_files
+            for name, overrides in configs for time_limit in time_limits for seed in seeds]
+
+    records = []
+    output_file = open(output, "a") if output else None
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(runBenchmark, *run) for run in runs]
+                for future in futures:
+                    records.append(future.result())
+                    writeRecord(records[-1], output_file)
+        else:
+            for run in runs:
+                records.append(runBenchmark(*run))
+                writeRecord(records[-1], output_file)
+    finally:
+        if output_file:
+            output_file.close()
+    return records
+
+
+def writeRecord(record, output_file):
+    print("{instance} {config} {time_limit}s seed {seed}: hard {hard}, soft {soft}, "
+          "best after {time_to_best:.1f}s, {moves_per_second:.0f} moves/s".format(**record))
+    if output_file:
+        output_file.write(json.dumps(record) + "\n")
+        output_file.flush()
+
+
+def readRecords(filename):
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarise(records):
+    """
+    returns the mean hard cost, soft cost, time to best and moves per second per (instance, configuration,
+    time limit)
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault((record["instance"], record["config"], record["time_limit"]), []).append(record)
+
+    summary = {}
+    for key, group in groups.items():
+        summary[key] = {field: sum(record[field] for record in group) / len(group)
+                        for field in ("hard", "soft", "time_to_best", "moves_per_second")}
+        summary[key]["runs"] = len(group)
+    return summary
+
+
+def compareToBaseline(records, baseline, tolerance=5.0):
+    """
+    prints the mean results per (instance, configuration, time limit) next to the baseline, so only runs with the
+    same time limit are compared; a mean soft cost more than
+    tolerance percent above the baseline, more hard violations or tolerance percent fewer moves per second
+    are reported as regressions
+
+    returns the number of regressions
+    """
+    current = summarise(records)
+    base = summarise(baseline)
+    regressions = 0
+
+    print("{:<14}{:<12}{:>8}{:>6}{:>18}{:>18}{:>24}".format("instance", "config", "limit", "runs", "hard", "soft",
+                                                           "moves/s"))
+    for key in sorted(current):
+        new = current[key]
+        if key not in base:
+            print("{:<14}{:<12}{:>8}{:>6}{:>18.1f}{:>18.1f}{:>24.0f}   (no baseline)".format(
+                key[0], key[1], key[2], new["runs"], new["hard"], new["soft"], new["moves_per_second"]))
+            continue
+        old = base[key]
+        flags = []
+        if new["hard"] > old["hard"]:
+            flags.append("hard")
+        if new["soft"] > old["soft"] * (1 + tolerance / 100) and new["soft"] > old["soft"]:
+            flags.append("soft")
+        if new["moves_per_second"] < old["moves_per_second"] * (1 - tolerance / 100):
+            flags.append("moves/s")
+        regressions += bool(flags)
+        print("{:<14}{:<12}{:>8}{:>6}{:>18}{:>18}{:>24}{}".format(
+            key[0], key[1], key[2], new["runs"],
+            "{:.1f} ({:.1f})".format(new["hard"], old["hard"]),
+            "{:.1f} ({:.1f})".format(new["soft"], old["soft"]),
+            "{:.0f} ({:.0f})".format(new["moves_per_second"], old["moves_per_second"]),
+            "   REGRESSION: " + ", ".join(flags) if flags else ""))
+    print("baseline values in brackets; {} regression(s)".format(regressions))
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="benchmark the solver on .ectt instances")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmark")
+    run.add_argument("--instances", nargs="+", default=["comp*.ectt"],
+                     help="glob patterns of instance files; without a folder, the datasets folder is searched")
+    run.add_argument("--seeds", nargs="+", type=int, default=[0])
+    run.add_argument("--time-limit", nargs="+", type=float, default=[initialisation.max_runtime],
+                     help="time limits in seconds; every configuration runs with each of them")
+    run.add_argument("--config", action="append", default=None,
+                     help="name:setting=value,... with settings of initialisation; may be repeated")
+    run.add_argument("--workers", type=int, default=1, help="number of runs in parallel")
+    run.add_argument("--output", default="benchmark.jsonl", help="the records are appended to this file")
+    run.add_argument("--baseline", help="results file to compare against")
+    run.add_argument("--tolerance", type=float, default=5.0, help="allowed deterioration in percent")
+
+    compare = commands.add_parser("compare", help="compare a results file against a baseline")
+    compare.add_argument("results")
+    compare.add_argument("baseline")
+    compare.add_argument("--tolerance", type=float, default=5.0, help="allowed deterioration in percent")
+
+    args = parser.parse_args(arguments)
+    if args.command == "run":
+        configs = [parseConfig(config) for config in (args.config or ["default"])]
+        records = runBenchmarks(instanceFiles(args.instances), configs, args.seeds, args.time_limit,
+                                args.workers, args.output)
+        if args.baseline:
+            return 1 if compareToBaseline(records, readRecords(args.baseline), args.tolerance) else 0
+    else:
+        return 1 if compareToBaseline(readRecords(args.results), readRecords(args.baseline), args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
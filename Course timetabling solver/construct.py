@@ -20,6 +20,7 @@ __author__ = 'Stephan Becker'
 import random
 import time
 import math
+import heapq
 
 # import cProfile
 
@@ -30,106 +31,140 @@ import soft
 import misc
 
 
-def computeAvailableTimeslots(course, listOfTimeslots=False):
+class SaturationQueue:
     """
-    returns a list and the total number of available timeslots for the course
+    priority queue of the courses with unassigned lectures for a DSatur-style construction, ordered by key():
+    with root = sqrt(unassigned lectures of the course) * (1 + weight of the course), the course with the smallest
+    available timeslots / root comes first, ties are broken by the smallest available positions (free rooms
+    large enough) * root and then by the most unassigned lectures of conflicting courses.
+    the weight grows for the courses which could not be placed in an iteration of constructTimetable()
+    (squeaky wheel), so they come earlier in the next one; the square root keeps a course with many unassigned
+    lectures from always coming before a course with fewer available timeslots.
+
+    a timeslot is available for a course if the course fits into it and it has a free room; the available
+    timeslots are kept as bitsets and updated after each placement for the conflict-graph neighbours of the
+    placed course only (and for all courses when a timeslot is full). the queue is a heap with lazy updates:
+    an updated course is pushed again, outdated entries are skipped, and the count of available positions,
+    which changes with every placement, is recomputed when a course reaches the top
     """
-    if listOfTimeslots:
-        count = 0
-        ts_list = []
-        for i in range(data.numberOfTimeslots):
-            if hard.courseFitsIntoTimeslot(course, i):
-                count += 1
-                ts_list.append(i)
-        return count, ts_list
-    else:
+
+    def __init__(self, events, weights=None):
+        self.weights = weights if weights is not None else [0] * len(data.courses)
+        self.remaining = [0] * len(data.courses)
+        for ev in events:
+            self.remaining[ev.index] += 1
+
+        R = data.numberOfRooms
+        self.freeRoomMask = [sum(1 << room for room in data.freeRooms[ts]) for ts in range(data.numberOfTimeslots)]
+        self.suitableRooms = [sum(1 << room for room in range(R) if data.roomCapacityExcess[c * R + room] == 0)
+                              for c in range(len(data.courses))]
+        self.available = [0] * len(data.courses)
+        self.conflictLectures = [0] * len(data.courses)
+        self.version = [0] * len(data.courses)
+        self.heap = []
+        for c, count in enumerate(self.remaining):
+            if count > 0:
+                ev = data.courseEvents[c]
+                for ts in range(data.numberOfTimeslots):
+                    if self.freeRoomMask[ts] and hard.courseFitsIntoTimeslot(ev, ts):
+                        self.available[c] |= 1 << ts
+                self.conflictLectures[c] = sum(self.remaining[n] for n in data.conflictNeighbours[c])
+                self.push(c)
+
+    def availablePositions(self, c):
         count = 0
-        for i in range(data.numberOfTimeslots):
-            if hard.courseFitsIntoTimeslot(course, i):
-                count += 1
+        mask = self.available[c]
+        suitable = self.suitableRooms[c]
+        while mask:
+            low = mask & -mask
+            count += (self.freeRoomMask[low.bit_length() - 1] & suitable).bit_count()
+            mask ^= low
         return count
 
-
-def getEventRanking1(ranking, num_lectures):
-    for ev in data.events:
-        apd = computeAvailableTimeslots(ev)
-        nl = num_lectures[ev.id]
-        rank = apd / math.sqrt(nl)
-        ranking[ev.id].append(rank)
-
-
-def computeAvailablePositions(course):
-    """
-    returns the total number of available positions for the course
-    """
-    count = 0
-    for pos in data.emptyPositions:
-        if soft.courseFitsIntoPosition(course, pos):
-            count += 1
-    return count
-
-
-def getEventRanking2(ranking, num_lectures):
-    for ev in data.events:
-        aps = computeAvailablePositions(ev)
-        nl = num_lectures[ev.id]
-        rank = aps * math.sqrt(nl)
-        ranking[ev.id].append(rank)
-
-
-def coursesHaveSameTeacher(course1, course2):
-    return course1.teacher == course2.teacher
-
-
-def coursesHaveStudentsInCommon(course1, course2):
-    curriculaOfCourse1 = data.coursesToCurricula[course1.id]
-    for cu in curriculaOfCourse1:
-        if course2.id in data.curriculaToCourses[cu]:
-            return True
-    return False
-
-
-def computeNumberOfCoursesWithCommonStudentsTeachers(course, courses):
-    """
-    returns the number of courses that have either the same teacher or common students
-    as the course
-    """
-    count = 0
-    for c in courses:
-        if c != course:
-            if coursesHaveSameTeacher(course, c) or coursesHaveStudentsInCommon(course, c):
-                count += 1
-    return count
-
-
-def getEventRanking3(ranking):
-    for ev in data.events:
-        rank = computeNumberOfCoursesWithCommonStudentsTeachers(ev, data.events)
-        ranking[ev.id].append(rank)
-
-
-def countUnassignedLectures():
-    counter = {}
-    for event in data.events:
-        try:
-            counter[event.id] += 1
-        except:
-            counter[event.id] = 1
-    return counter
-
-
-def orderEventsByPriority():
+    def key(self, c):
+        root = math.sqrt(self.remaining[c]) * (1 + self.weights[c])
+        return (self.available[c].bit_count() / root, self.availablePositions(c) * root, -self.conflictLectures[c])
+
+    def push(self, c):
+        self.version[c] += 1
+        heapq.heappush(self.heap, (self.key(c), self.version[c], c))
+
+    def pop(self):
+        """
+        returns the course whose next lecture is placed, None if all lectures are placed
+        """
+        while self.heap:
+            key, version, c = heapq.heappop(self.heap)
+            if version != self.version[c]:
+                continue
+            current = self.key(c)
+            if current != key:
+                self.version[c] += 1
+                heapq.heappush(self.heap, (current, self.version[c], c))
+                continue
+            return c
+        return None
+
+    def lectureLeft(self, c):
+        """
+        a lecture of the course c could not be placed
+        """
+        self.remaining[c] -= 1
+        for n in data.conflictNeighbours[c]:
+            self.conflictLectures[n] -= 1
+        if self.remaining[c] > 0:
+            self.push(c)
+
+    def lecturePlaced(self, c, position):
+        """
+        a lecture of the course c has been assigned to the position
+        """
+        room, ts = position
+        bit = 1 << ts
+        self.remaining[c] -= 1
+        self.freeRoomMask[ts] &= ~(1 << room)
+        if not self.freeRoomMask[ts]:
+            # the timeslot is full, it is not available for any course
+            updated = [n for n in range(len(data.courses)) if self.available[n] & bit]
+        else:
+            updated = [n for n in data.conflictNeighbours[c] if self.available[n] & bit]
+        for n in data.conflictNeighbours[c]:
+            self.conflictLectures[n] -= 1
+        self.available[c] &= ~bit
+        for n in updated:
+            self.available[n] &= ~bit
+            if self.remaining[n] > 0 and n != c:
+                self.push(n)
+        if self.remaining[c] > 0:
+            self.push(c)
+
+
+def placeEventsBySaturation(timeslotsFirst=False, weights=None):
     """
-    order the events in unassignedEvents by a heuristic
+    assigns the unassigned events one by one, always a lecture of the course with the fewest
+    available timeslots left (see SaturationQueue), to the best position for it (see orderPositionsByPriority());
+    with timeslotsFirst, the lecture goes to the best timeslot for it (see chooseTimeslot()) and
+    the rooms are left to assignRoomsByMatching().
+    the events without a feasible position are moved to unplacedEvents;
+    weights (one per course) bring the lectures of the courses with a higher weight forward
     """
-    ranking = {}
-    for ev in data.events:
-        ranking[ev.id] = []
-    num_lectures = countUnassignedLectures()
-    getEventRanking1(ranking, num_lectures)
-    getEventRanking2(ranking, num_lectures)
-    getEventRanking3(ranking)
-    data.events.sort(key=lambda ev: ranking[ev.id], reverse=True)
+    queue = SaturationQueue(data.events, weights)
+    data.events = []
+    c = queue.pop()
+    while c is not None:
+        ev = data.courseEvents[c]
+        if timeslotsFirst:
+            list_positions = chooseTimeslot(ev)
+        else:
+            list_positions = orderPositionsByPriority(ev)
+        # if there are no feasible positions left, move event from unassigned to unplaced
+        if len(list_positions) == 0:
+            data.unplacedEvents.append(ev)
+            queue.lectureLeft(c)
+        else:
+            hard.assignCourseToPosition(ev, list_positions[0])
+            queue.lecturePlaced(c, list_positions[0])
+        c = queue.pop()
 
 
 def orderPositionsByPriority(event):
@@ -138,14 +173,17 @@ def orderPositionsByPriority(event):
     """
     good_pos = []
     feasible_pos = []
-    for pos in data.emptyPositions:
-        if soft.courseFitsIntoPosition(event, pos):
-            good_pos.append(pos)
-        elif hard.courseFitsIntoTimeslot(event, pos[1]):
-            # compute the penalty for room capacity
-            rcap = soft.roomCapacity(event, pos[0])
-            feasible_pos.append((rcap, pos))
-            # sort the feasible positions by their penalty
+    # only the free rooms of the timeslots the event fits into are considered
+    for ts in range(data.numberOfTimeslots):
+        if data.freeRooms[ts] and hard.courseFitsIntoTimeslot(event, ts):
+            for room in data.freeRooms[ts]:
+                # compute the penalty for room capacity
+                rcap = soft.roomCapacity(event, room)
+                if rcap == 0:
+                    good_pos.append((room, ts))
+                else:
+                    feasible_pos.append((rcap, (room, ts)))
+    # sort the feasible positions by their penalty
     feasible_pos.sort()
     feasible_pos2 = [pos for (rcap, pos) in feasible_pos]
     # mix it up a bit more
@@ -154,62 +192,217 @@ def orderPositionsByPriority(event):
     return all_pos
 
 
+def capacityCost(sizes, capacities):
+    """
+    returns the smallest RoomCapacity penalty of a timeslot holding lectures with the numbers of students sizes,
+    given the capacities of all rooms in descending order:
+    the biggest lecture in the biggest room and so on is an optimal assignment
+    """
+    sizes = sorted(sizes, reverse=True)
+    return sum(max(size - capacity, 0) for size, capacity in zip(sizes, capacities)) * data.RoomCapacityPenalty
+
+
+def chooseTimeslot(event):
+    """
+    returns a list with a position in the best timeslot for the event, an empty list if the event fits nowhere.
+    the room is any free room, the rooms of a timeslot are assigned later by assignRoomsByMatching();
+    the best timeslot adds the least estimated cost: the increase of the smallest RoomCapacity penalty of the
+    timeslot, MinWorkingDays if the course has a lecture on the day and too few working days,
+    IsolatedLectures for each curriculum of the course without a lecture in an adjacent timeslot of the day
+    """
+    capacities = sorted((room.capacity for room in data.rooms), reverse=True)
+    T = data.numberOfTimeslots
+    periods = data.header.periods
+    c = event.index
+    curricula = data.courseIndexToCurricula[c]
+    daysUsed = {ts // periods for ts in range(T) if data.timeslotCourseCount[ts][c] > 0}
+    fewDays = len(daysUsed) < data.courses[c].minWorkingDays
+
+    best = []
+    best_cost = None
+    for ts in range(T):
+        if not data.freeRooms[ts] or not hard.courseFitsIntoTimeslot(event, ts):
+            continue
+        sizes = [data.courses[course].num_students for course in data.timetable[ts::T] if course >= 0]
+        cost = capacityCost(sizes + [event.num_students], capacities) - capacityCost(sizes, capacities)
+        if fewDays and ts // periods in daysUsed:
+            cost += data.MinWorkingDays
+        for cu in curricula:
+            if not ((ts % periods > 0 and data.timeslotCurriculumCount[ts - 1][cu] > 0) or
+                    (ts % periods < periods - 1 and data.timeslotCurriculumCount[ts + 1][cu] > 0)):
+                cost += data.IsolatedLectures
+        if best_cost is None or cost < best_cost:
+            best = [ts]
+            best_cost = cost
+        elif cost == best_cost:
+            best.append(ts)
+
+    if not best:
+        return []
+    ts = random.choice(best)
+    return [(min(data.freeRooms[ts]), ts)]
+
+
+def assignRoomsByMatching():
+    """
+    reassigns the rooms of the lectures of each timeslot by a minimum cost assignment (misc.minimumCostAssignment())
+    of lectures to rooms: the cost of a room is its RoomCapacity penalty plus RoomStability if it is not the
+    home room of the course, the room of its lecture in the first timeslot matched; ties go to the room with the
+    fewest empty seats, so the big rooms are left for the big courses
+    """
+    T = data.numberOfTimeslots
+    R = data.numberOfRooms
+    seats = [room.capacity for room in data.rooms]
+    # cost of one empty seat, a cost unit outweighs all empty seats of a timeslot
+    unit = sum(seats) + 1
+    homeRoom = {}
+    for ts in range(T):
+        lectures = [(room, c) for room, c in enumerate(data.timetable[ts::T]) if c >= 0]
+        if not lectures:
+            continue
+        costs = []
+        for old_room, c in lectures:
+            students = data.courses[c].num_students
+            home = homeRoom.get(c)
+            costs.append([(data.roomCapacityExcess[c * R + r] +
+                           (data.RoomStability if home is not None and r != home else 0)) * unit +
+                          max(seats[r] - students, 0) for r in range(R)])
+        rooms = misc.minimumCostAssignment(costs)
+
+        for old_room, c in lectures:
+            hard.setPosition((old_room, ts), None)
+        for (old_room, c), room in zip(lectures, rooms):
+            hard.setPosition((room, ts), data.courseEvents[c])
+            homeRoom.setdefault(c, room)
+
+
+# iterations in which an ejected lecture may not eject its way back into its timeslot
+ejection_tenure = 10
+
+
+def ejectFor(event, weights, tabuUntil, iteration):
+    """
+    conflict-directed ejection: assigns the event to the timeslot where the lectures in its way have the
+    smallest total weight, the conflicting lectures and, if the timeslot has no free room left, the lecture
+    in the room which suits the event best are removed and become unassigned events.
+    a removed lecture may not eject its way back into its timeslot before tabuUntil[course * T + timeslot];
+    the event stays unassigned if every timeslot is unavailable or tabu
+
+    returns the removed events
+    """
+    T = data.numberOfTimeslots
+    C = len(data.courses)
+    R = data.numberOfRooms
+    c = event.index
+
+    best = []
+    best_cost = None
+    for ts in range(T):
+        if not hard.teacherIsAvailable(event, ts) or data.timeslotCourseCount[ts][c] > 0 or \
+                tabuUntil[c * T + ts] > iteration:
+            continue
+        cost = 0
+        conflicts = []
+        others = []
+        for room, n in enumerate(data.timetable[ts::T]):
+            if n < 0:
+                continue
+            if data.conflictMatrix[c * C + n]:
+                conflicts.append(room)
+                cost += weights[n]
+            else:
+                others.append(room)
+        if not conflicts and not data.freeRooms[ts]:
+            # the room is taken from the lecture of the lowest weight, the smallest excess of students first
+            room = min(others, key=lambda r: (weights[data.timetable[r * T + ts]], data.roomCapacityExcess[c * R + r]))
+            conflicts.append(room)
+            cost += weights[data.timetable[room * T + ts]]
+        cost += len(conflicts)
+        if best_cost is None or cost < best_cost:
+            best = [(ts, conflicts)]
+            best_cost = cost
+        elif cost == best_cost:
+            best.append((ts, conflicts))
+
+    if not best:
+        data.events.append(event)
+        return []
+
+    ts, conflicts = random.choice(best)
+    ejected = []
+    for room in conflicts:
+        ev = hard.removeCourseAtPosition((room, ts))
+        tabuUntil[ev.index * T + ts] = iteration + ejection_tenure
+        ejected.append(ev)
+    room = min(data.freeRooms[ts], key=lambda r: data.roomCapacityExcess[c * R + r])
+    hard.assignCourseToPosition(event, (room, ts))
+    data.events.extend(ejected)
+    return ejected
+
+
+def restoreConstruction(snapshot):
+    """
+    makes the timetable snapshot the current state of the construction, the missing lectures become
+    the unassigned events
+    """
+    hard.restoreSnapshot(snapshot)
+    placed = [0] * len(data.courses)
+    for c in data.timetable:
+        if c >= 0:
+            placed[c] += 1
+    data.events = [data.courseEvents[c] for c, course in enumerate(data.courses)
+                   for i in range(course.num_lectures - placed[c])]
+    data.unplacedEvents = []
+
+
 def constructTimetable():
     """
-    constructs a feasible solution or a partially feasible solution; terminates if no solution is found after 10 seconds
-    adapted from Lü, Hao (2010)
+    constructs a feasible solution or a partially feasible solution, adapted from Lü, Hao (2010):
+    the unassigned events are placed in saturation order (see placeEventsBySaturation()), each event
+    without a feasible position is then assigned by ejecting the lectures in its way (see ejectFor()) and
+    the ejected lectures are placed in the next iteration.
+    the courses whose lectures could not be placed gain weight (squeaky wheel): they are placed earlier
+    and ejected later. iterates until all events are placed or initialisation.TL_construction seconds
+    (or the runtime of the run) have passed; the timetable with the fewest unassigned events is kept
+
     returns distance to feasibility
     """
-    startingTime = time.clock()
-    # it=iter(range(100))
+    startingTime = time.perf_counter()
+    T = data.numberOfTimeslots
+    weights = [0] * len(data.courses)
+    tabuUntil = [0] * (len(data.courses) * T)
+    best_distance = None
+    best_tt = None
     it = 0
-    while (len(data.events) > 0 or len(
-            data.unplacedEvents) > 0) and it < 1: #time.clock()-startingTime < initialisation.TL_construction:
-
+    while True:
         it += 1
 
-        # display current cost every 5 seconds
-        # if time.clock() - startingTime > 5:
-        #     startingTime += 5
-        #     print(len(data.events))
+        placeEventsBySaturation(initialisation.constructType == "matching", weights)
+        distance = len(data.unplacedEvents)
+        if best_distance is None or distance < best_distance:
+            best_distance = distance
+            best_tt = data.takeSnapshot()
+        if distance == 0 or time.perf_counter() - startingTime >= initialisation.TL_construction or \
+                time.perf_counter() - data.starting_time >= data.max_runtime:
+            break
+
+        unplaced = data.unplacedEvents
+        data.unplacedEvents = []
+        random.shuffle(unplaced)
+        for ev in unplaced:
+            weights[ev.index] += 1
+            ejectFor(ev, weights, tabuUntil, it)
+
+    if distance > best_distance:
+        restoreConstruction(best_tt)
+    else:
+        data.events.extend(data.unplacedEvents)
+        data.unplacedEvents = []
 
-        orderEventsByPriority()
-        num_events = len(data.events)
-        for i in range(num_events):
-            ev = data.events.pop()
-            list_positions = orderPositionsByPriority(ev)
-            # if there are no feasible positions left, move event from unassigned to unplaced
-            if len(list_positions) == 0:
-                data.unplacedEvents.append(ev)
-            else:
-                hard.assignCourseToPosition(ev, list_positions[0])
-
-        num_unplaced = len(data.unplacedEvents)
-        random.shuffle(data.unplacedEvents)
-        new_positions = []
-
-        for i in range(num_unplaced):
-            pos = random.choice(data.forbiddenPositions)
-            ev = hard.removeCourseAtPosition(pos)
-            data.forbiddenPositions.remove(pos)
-            data.events.append(ev)
-            new_positions.append(pos)
-
-        for i in range(num_unplaced):
-            unplEv = data.unplacedEvents.pop()
-            assigned = False
-            for pos in new_positions:
-                if hard.courseFitsIntoTimeslot(unplEv, pos[1]):
-                    hard.assignCourseToPosition(unplEv, pos)
-                    new_positions.remove(pos)
-                    assigned = True
-                    break
-            if not assigned:
-                data.events.append(unplEv)
+    if initialisation.constructType == "matching":
+        assignRoomsByMatching()
 
     return len(data.events)
 
 
 # cProfile.run( "constructTimetable()")
-
-construction_time, distanceToFeasibility = misc.timedcall(constructTimetable)
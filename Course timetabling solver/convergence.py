@@ -0,0 +1,87 @@
+""" Curriculum-based course timetabling solver;
+    solves timetabling problems formulated in .ectt file format (http://tabu.diegm.uniud.it/ctt/)
+    Copyright (C) 2013  Stephan E. Becker
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+__author__ = 'Stephan Becker'
+
+import os
+import json
+import time
+
+import data
+
+# convergence trace of a run (initialisation.trace): the searches write a record every trace_interval seconds
+# to a JSON lines file, so the memory needed does not grow with the runtime.
+# the first line describes the run, every further line is a record
+#   {"time": seconds since the start of the run, "phase": "feasibility" or "improvement", "iteration": ...,
+#    "cost": current distance or soft cost, "best": best distance or soft cost,
+#    "parameter": temperature of simulated annealing or tabu tenure/length of tabu search}
+
+traces_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traces')
+
+enabled = False
+interval = 1.0
+# time.perf_counter() at which the next record is due
+next_time = 0
+
+trace_file = None
+filename = None
+
+
+def start(name, info, trace_interval):
+    """
+    starts the trace of a run into the file name.jsonl of the folder traces, a record every trace_interval seconds;
+    info is a dict describing the run and is written as the first line
+    """
+    global enabled, interval, next_time, trace_file, filename
+    os.makedirs(traces_dir, exist_ok=True)
+    filename = os.path.join(traces_dir, name + ".jsonl")
+    trace_file = open(filename, "w")
+    trace_file.write(json.dumps(info) + "\n")
+    interval = trace_interval
+    next_time = time.perf_counter()
+    enabled = True
+
+
+def record(phase, iteration, cost, best, parameter=None):
+    """
+    writes a record and schedules the next one; the searches call it when time.perf_counter() >= next_time
+    """
+    global next_time
+    now = time.perf_counter()
+    trace_file.write(json.dumps({"time": round(now - data.starting_time, 3), "phase": phase, "iteration": iteration,
+                                 "cost": cost, "best": best, "parameter": parameter}) + "\n")
+    next_time = now + interval
+
+
+def stop():
+    """
+    ends the trace, returns the filename
+    """
+    global enabled, trace_file
+    enabled = False
+    trace_file.close()
+    trace_file = None
+    return filename
+
+
+def readTrace(name):
+    """
+    returns the description of the run and the records of a trace file
+    """
+    with open(name) as f:
+        info = json.loads(f.readline())
+        return info, [json.loads(line) for line in f]
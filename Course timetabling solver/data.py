@@ -18,16 +18,22 @@
 __author__ = 'Stephan Becker'
 import os
 import time
+import copy
+import atexit
+import pickle
+import hashlib
+from array import array
+from multiprocessing import shared_memory
 
 import initialisation
 
 
-# the time limit in seconds
-# max_runtime = initialisation.max_runtime
-# timelimit_construction = time.clock() + initialisation.max_construction
-# timelimit = time.clock() + max_runtime
+# the time limit in seconds; set for every run by solver.Solver
+max_runtime = initialisation.max_runtime
+# timelimit_construction = time.perf_counter() + initialisation.max_construction
+# timelimit = time.perf_counter() + max_runtime
 
-starting_time = time.clock()
+starting_time = time.perf_counter()
 
 
 # penalty weights according to the UD specification by (De Cesco, Di Gaspero, Schaerf, 2012)
@@ -53,9 +59,6 @@ for i in range(1, 5):
 # print(test_instances)
 # print(comp_instances)
 
-# input_file_choice = test_instances[0]
-# input_file=comp_instances[0]
-
 all_instances = [test_instances, comp_instances]
 
 
@@ -68,59 +71,41 @@ def promptUserForInstanceChoice():
     return all_instances[choice_type][choice_number]
 
 
-input_file_choice = all_instances[initialisation.choice_set][initialisation.choice_inst]
-
-
-# input_file_choice=promptUserForInstanceChoice()
-
+datasets_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets')
 
-datasets_dir = os.path.join(os.path.dirname(__file__), 'datasets') + "\\"
 
-input_file = datasets_dir + input_file_choice
-
-ttFile = open(input_file)
-
-InputTTData = []
-for line in ttFile:
-    line = line[:-1] # last character is a newline
-    InputTTData.append(line)
-
-ttFile.close()
+def instanceFile(choice_set, choice_inst):
+    """
+    returns the path of an instance in the datasets folder;
+    choice_set 0 for test or 1 for comp, choice_inst 0 for toy, 1-4 for test, 1-21 for comp
+    """
+    return os.path.join(datasets_dir, all_instances[choice_set][choice_inst])
 
 
-def prep_data(section_name):
+def parseInputFile(input_file):
     """
-    prepares the raw data for the algo:
-    splits the raw list into sections,
-    splits the section string into a list,
-    turns number strings into integers
+    reads the .ectt file in a single pass;
+    returns a dict mapping the section names ("HEADER", "COURSES:", ...) to the lines of the section,
+    each line split into a list, number strings are turned into integers
     """
-    if section_name == "HEADER":
-        start = 0
-    else:
-        start = InputTTData.index(section_name) + 1 # don't include the section name in the list
-    stop = InputTTData.index("", start)
-    tmp_section = InputTTData[start:stop]
-    section = []
-    for i in tmp_section:
-        part = i.split()
-        part2 = []
-        for element in part:
-            try:
-                e = int(element)
-            except:
-                e = element
-            finally:
-                part2.append(e)
-        section.append(part2)
-    return section
+    sections = {}
+    section = sections["HEADER"] = []
+    with open(input_file) as ttFile:
+        for line in ttFile:
+            part = line.split()
+            if not part:
+                continue
+            if part[0] == "END.":
+                break
+            if len(part) == 1 and part[0].endswith(":"):
+                section = sections[part[0]] = []
+            else:
+                section.append([int(element) if element.isdigit() else element for element in part])
+    return sections
 
 
 #Header
 # Section "HEADER"
-header1 = prep_data("HEADER")
-
-
 class Header:
     def __init__(self, header):
         self.name = header[0][1].lower()
@@ -138,19 +123,13 @@ class Header:
         return "<Name: {}, courses: {}, rooms: {}, days {}>".format(self.name, self.courses, self.rooms, self.days)
 
 
-header = Header(header1)
-
-
-
 # List of courses
 # Section "COURSES:"
 # <CourseID> <Teacher> <# Lectures> <MinWorkingDays> <# Students> <Double Lectures>
-courses1 = prep_data("COURSES:")
-
-
 class Course:
-    def __init__(self, course):
+    def __init__(self, course, index):
         self.id = course[0]
+        self.index = index
         self.teacher = course[1]
         self.num_lectures = course[2]
         self.minWorkingDays = course[3]
@@ -180,12 +159,10 @@ class Course:
                     self.num_students, self.double_lectures)
 
 
-courses = [Course(c) for c in courses1]
-
-
 class Event:
-    def __init__(self, course):
+    def __init__(self, course, index):
         self.id = course[0]
+        self.index = index
         self.teacher = course[1]
         self.minWorkingDays = course[3]
         self.num_students = course[4]
@@ -200,16 +177,9 @@ class Event:
         return "<{}>".format(self.id)
 
 
-events = [Event(c) for c in courses1 for i in range(c[2])]
-
-# print(events)
-
 # List of rooms
 # Section "ROOMS:"
 # <RoomID> <Capacity> <Site>
-rooms1 = prep_data("ROOMS:")
-
-
 class Room:
     def __init__(self, room):
         self.id = room[0]
@@ -220,21 +190,9 @@ class Room:
         return "<ID: {}, cap: {}, site: {}>".format(self.id, self.capacity, self.site)
 
 
-rooms = [Room(r) for r in rooms1]
-
-# mapping the roomIndex to the roomName
-roomIndexToName = {}
-for roomIndex, room in enumerate(rooms1):
-    roomIndexToName[roomIndex] = room[0]
-
-
-
 # List of curricula
 # Section "CURRICULA:"
 # <CurriculumID> <# Courses> <CourseID> ... <CourseID>
-curricula1 = prep_data("CURRICULA:")
-
-
 class Curriculum:
     def __init__(self, cu):
         self.id = cu[0]
@@ -245,50 +203,26 @@ class Curriculum:
         return "<ID: {}, num_courses: {}, courses: {}>".format(self.id, self.num_courses, self.courses)
 
 
-curricula = [Curriculum(c) for c in curricula1]
-
-
-
 # List of unavailability_constraints
 # Section "UNAVAILABILITY_CONSTRAINTS:"
 # <CourseID> <Day> <Day_Period>
 # All IDs are strings without blanks starting with a letter. Days and periods start from 0.
 # For example, the constraint TecCos 3 2 states that
 # course TecCos cannot be scheduled in the third (2) period of Thursdays (3).
-unavailability_constraints_org = prep_data("UNAVAILABILITY_CONSTRAINTS:")
-
-
 class Unavailability:
-    def __init__(self, una):
+    def __init__(self, una, periods):
         self.courseID = una[0]
         self.day = una[1]
         self.dayPeriod = una[2]
-        self.timeslot = una[1] * header.periods + una[2] # Day*numberOfPeriodsPerDay + Day_Period = timeslot
+        self.timeslot = una[1] * periods + una[2] # Day*numberOfPeriodsPerDay + Day_Period = timeslot
 
     def __repr__(self):
         return "<course: {}, timeslot: {}>".format(self.courseID, self.timeslot)
 
 
-# modified list of unavailability_constraints,
-# <CourseID> <Timeslot>
-unavailability_constraints1 = []
-for constraint in unavailability_constraints_org:
-    newlist = []
-    newlist.append(constraint[0])
-    timeslot = constraint[1] * header.periods + constraint[2]  # Day*numberOfPeriodsPerDay + Day_Period = timeslot
-    newlist.append(timeslot)
-    unavailability_constraints1.append(newlist)
-
-unavailability_constraints = [Unavailability(u) for u in unavailability_constraints_org]
-
-
-
 # List of ROOM_CONSTRAINTS
 # Section "ROOM_CONSTRAINTS:"
 # <CourseID> <RoomID>
-room_constraints1 = prep_data("ROOM_CONSTRAINTS:")
-
-
 class RoomConstraint:
     def __init__(self, rc):
         self.courseID = rc[0]
@@ -298,100 +232,523 @@ class RoomConstraint:
         return "<course: {}, room: {}>".format(self.courseID, self.roomID)
 
 
-room_constraints = [RoomConstraint(rc) for rc in room_constraints1]
+class Instance:
+    """
+    the data of an .ectt file and all mappings derived from it;
+    an instance is parsed once and can be used for any number of runs of the solver,
+    its attributes cannot be changed once it has been built. See loadInstance() for a cached instance
+    """
+
+    def __init__(self, input_file):
+        self.input_file = input_file
+        self.input_file_choice = os.path.basename(input_file)
+
+        sections = parseInputFile(input_file)
 
+        self.header = Header(sections["HEADER"])
 
+        courses1 = sections.get("COURSES:", [])
+        self.courses = [Course(c, i) for i, c in enumerate(courses1)]
 
-# numberOfTimeslots == Days * PeriodsPerDay
-# numberOfTimeslots = header[3][1] * header[4][1]
-numberOfTimeslots = header.days * header.periods
-numberOfRooms = len(rooms)
+        # one event object per course; all lectures of a course share it,
+        # the timetable itself only stores course indices
+        self.courseEvents = [Event(c, i) for i, c in enumerate(courses1)]
 
+        self.rooms = [Room(r) for r in sections.get("ROOMS:", [])]
 
-# Timetable == Rooms(rows) * Timeslots(columns)
-# tt = numpy.empty((numberOfRooms, numberOfTimeslots))
+        # mapping the roomIndex to the roomName
+        self.roomIndexToName = {}
+        for roomIndex, room in enumerate(self.rooms):
+            self.roomIndexToName[roomIndex] = room.id
 
+        self.curricula = [Curriculum(c) for c in sections.get("CURRICULA:", [])]
 
+        self.unavailability_constraints = [Unavailability(u, self.header.periods)
+                                           for u in sections.get("UNAVAILABILITY_CONSTRAINTS:", [])]
 
-# mapping a timeslot to a day and dayPeriod
-mapTimeslotToDayAndPeriod = {}
-for i in range(numberOfTimeslots):
-    mapTimeslotToDayAndPeriod[i] = (i // header.periods, i % header.periods)
+        self.room_constraints = [RoomConstraint(rc) for rc in sections.get("ROOM_CONSTRAINTS:", [])]
 
+        # numberOfTimeslots == Days * PeriodsPerDay
+        self.numberOfTimeslots = self.header.days * self.header.periods
+        self.numberOfRooms = len(self.rooms)
 
-def convertTimeslotToDayPeriod(timeslot):
+        # mapping a timeslot to a day and dayPeriod
+        self.mapTimeslotToDayAndPeriod = {}
+        for i in range(self.numberOfTimeslots):
+            self.mapTimeslotToDayAndPeriod[i] = (i // self.header.periods, i % self.header.periods)
+
+        self.days = []
+        day = []
+        for ts in range(self.numberOfTimeslots):
+            day.append(ts)
+            if ts % self.header.periods == self.header.periods - 1:
+                self.days.append(day)
+                day = []
+
+        # List of courses with the same teacher,
+        # dict mapping a teacher to all his courses
+        self.teachers = {}
+        for course in self.courses:
+            teacher = course.teacher
+            if teacher not in self.teachers:
+                self.teachers[teacher] = []
+            self.teachers[teacher].append(course.id)
+
+        # mapping of the teacher to its index and of the course index to the index of its teacher
+        self.teacherNameToIndex = {}
+        for i, teacher in enumerate(self.teachers):
+            self.teacherNameToIndex[teacher] = i
+
+        self.courseIndexToTeacher = [self.teacherNameToIndex[course.teacher] for course in self.courses]
+
+        # Map the course_name to its index in "courses"
+        self.courseNameToIndex = {}
+        for i, course in enumerate(self.courses):
+            self.courseNameToIndex[course.id] = i
+
+        # dense availability table of the courses, indexed by course index * numberOfTimeslots + timeslot;
+        # 1 if the course may be scheduled in the timeslot, 0 if it is unavailable
+        self.courseAvailability = bytearray([1]) * (len(self.courses) * self.numberOfTimeslots)
+        for constraint in self.unavailability_constraints:
+            self.courseAvailability[self.courseNameToIndex[constraint.courseID] * self.numberOfTimeslots
+                                    + constraint.timeslot] = 0
+
+        # mapping of the curriculum to the courses in the curriculum
+        self.curriculaToCourses = {}
+        for cu in self.curricula:
+            self.curriculaToCourses[cu.id] = cu.courses
+
+        # mapping of the course to all curricula containing the course
+        self.coursesToCurricula = {}
+        for course in self.courses:
+            self.coursesToCurricula[course.id] = []
+        for cu, cuList in self.curriculaToCourses.items():
+            for course in cuList:
+                if not self.coursesToCurricula[course] or self.coursesToCurricula[course][-1] != cu:
+                    self.coursesToCurricula[course].append(cu)
+
+        # mapping of the course index to the indices of all curricula containing the course
+        self.curriculumIdToIndex = {}
+        for i, cu in enumerate(self.curricula):
+            self.curriculumIdToIndex[cu.id] = i
+
+        self.courseIndexToCurricula = []
+        for course in self.courses:
+            self.courseIndexToCurricula.append([self.curriculumIdToIndex[cu]
+                                                for cu in self.coursesToCurricula[course.id]])
+
+        # conflict graph of the courses: 2 courses conflict if they share a curriculum or a teacher;
+        # conflictMatrix[c1 * courses + c2] is 1 if the courses conflict, a course conflicts with itself
+        numberOfCourses = len(self.courses)
+        self.conflictMatrix = bytearray(numberOfCourses * numberOfCourses)
+        for c in range(numberOfCourses):
+            self.conflictMatrix[c * numberOfCourses + c] = 1
+        for members in list(self.curriculaToCourses.values()) + list(self.teachers.values()):
+            members = [self.courseNameToIndex[course] for course in members]
+            for c1 in members:
+                for c2 in members:
+                    self.conflictMatrix[c1 * numberOfCourses + c2] = 1
+
+        # the conflicting courses of each course (without the course itself)
+        # and the pairs (c1, c2) with c1 < c2 of conflicting courses
+        neighbours = []
+        for c1 in range(numberOfCourses):
+            row = self.conflictMatrix[c1 * numberOfCourses:(c1 + 1) * numberOfCourses]
+            neighbours.append([c2 for c2 in range(numberOfCourses) if row[c2] and c2 != c1])
+        self.conflictNeighbours = RaggedArray(neighbours)
+        self.conflictingCourses = RaggedArray((c1, c2) for c1 in range(numberOfCourses)
+                                              for c2 in neighbours[c1] if c2 > c1)
+
+        # bitsets of timeslots (bit ts stands for timeslot ts) for the evaluation of whole timetables:
+        # the timeslots of each day, the first and the last timeslots of all days
+        periods = self.header.periods
+        self.dayMasks = [((1 << periods) - 1) << (d * periods) for d in range(self.header.days)]
+        self.firstPeriodMask = sum(1 << (d * periods) for d in range(self.header.days))
+        self.lastPeriodMask = self.firstPeriodMask << (periods - 1)
+
+        # RoomCapacity penalty of a lecture of a course in a room, index course * numberOfRooms + room
+        self.roomCapacityExcess = array('i', [max(course.num_students - room.capacity, 0) * RoomCapacityPenalty
+                                              for course in self.courses for room in self.rooms])
+
+        self.frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "frozen", False):
+            raise AttributeError("an Instance cannot be changed")
+        object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return "<Instance: {}>".format(self.header)
+
+
+# parsed instances are cached in this folder, keyed by the hash of the .ectt file and of everything the derived
+# data of an Instance depends on: the penalty weights and the source of this module, which defines the Instance
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+
+def cacheKey(file_content):
     """
-    returns the day and dayPeriod of a timeslot
+    returns the key of the cached instance parsed from the content of an .ectt file
     """
-    day, period = mapTimeslotToDayAndPeriod[timeslot]
-    return day, period
+    key = hashlib.sha1(file_content)
+    key.update(repr((RoomCapacityPenalty, MinWorkingDays, IsolatedLectures, RoomStability)).encode())
+    with open(__file__, "rb") as source:
+        key.update(source.read())
+    return key.hexdigest()
 
 
-days = []
-day = []
-for ts in range(numberOfTimeslots):
-    day.append(ts)
-    if ts % header.periods == header.periods - 1:
-        days.append(day)
-        day = []
+def loadInstance(input_file, cache=True):
+    """
+    returns the Instance of the .ectt file; if cache is True, the instance is loaded from the cache
+    if it has been parsed before, otherwise it is parsed and saved to the cache
+    """
+    if not cache:
+        return Instance(input_file)
+
+    with open(input_file, "rb") as ttFile:
+        cache_file = os.path.join(cache_dir, "{}-{}.pickle".format(os.path.basename(input_file),
+                                                                   cacheKey(ttFile.read())))
+    try:
+        with open(cache_file, "rb") as f:
+            inst = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        inst = Instance(input_file)
+        # write to a temporary file first, so parallel runs never read a partial cache file;
+        # if the cache cannot be written (e.g. a read-only solver folder), the parsed instance is used uncached
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_file, "wb") as f:
+                pickle.dump(inst, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+        return inst
+
+    # the cached instance may have been parsed from a copy of the file at another path
+    object.__setattr__(inst, "input_file", input_file)
+    object.__setattr__(inst, "input_file_choice", os.path.basename(input_file))
+    return inst
 
 
+class PositionSet:
+    """
+    set of positions (room, timeslot) with constant time add, remove and random choice;
+    the positions are kept in a list, a removed position is replaced by the last one in the list
+    """
+
+    def __init__(self, positions=()):
+        self.positions = []
+        self.index = {}
+        for position in positions:
+            self.add(position)
+
+    def add(self, position):
+        if position not in self.index:
+            self.index[position] = len(self.positions)
+            self.positions.append(position)
+
+    def remove(self, position):
+        i = self.index.pop(position)
+        last = self.positions.pop()
+        if i < len(self.positions):
+            self.positions[i] = last
+            self.index[last] = i
+
+    def discard(self, position):
+        if position in self.index:
+            self.remove(position)
+
+    def __contains__(self, position):
+        return position in self.index
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __getitem__(self, i):
+        return self.positions[i]
+
+    def __repr__(self):
+        return "<PositionSet: {}>".format(self.positions)
+
+
+class RaggedArray:
+    """
+    a list of lists of ints stored in 2 flat arrays, so it can be shared with worker processes
+    (see shareInstance()): row i holds values[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, rows=(), offsets=None, values=None):
+        if offsets is not None:
+            self.offsets = offsets
+            self.values = values
+            return
+        self.offsets = array('i', [0])
+        self.values = array('i')
+        for row in rows:
+            self.values.extend(row)
+            self.offsets.append(len(self.values))
+
+    def __getitem__(self, i):
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return "<RaggedArray: {} rows>".format(len(self))
+
+
+# the flat matrices of an instance which worker processes share, see shareInstance();
+# a RaggedArray is shared as its offsets and its values. courseIndexToCurricula stays a list of lists:
+# it is read for every change of a move, and a RaggedArray row costs a method call and a slice
+shared_matrices = ("courseAvailability", "conflictMatrix", "roomCapacityExcess", "conflictNeighbours",
+                   "conflictingCourses")
+
+# the shared memory blocks attached by this process and the views of their matrices, see attachInstance()
+attached_blocks = {}
+attached_views = []
+
+
+def shareInstance(inst):
+    """
+    copies the flat matrices of the instance into a block of shared memory;
+    returns the block and a copy of the instance without the matrices, which is cheap to send
+    to worker processes; the workers attach the matrices with attachInstance().
+    the caller has to close and unlink the block once all workers are done
+    """
+    layout = []
+    size = 0
+    for name in shared_matrices:
+        matrix = getattr(inst, name)
+        parts = [("offsets", matrix.offsets), ("values", matrix.values)] if isinstance(matrix, RaggedArray) \
+            else [(None, matrix)]
+        for part, flat in parts:
+            typecode = flat.typecode if isinstance(flat, array) else "B"
+            nbytes = memoryview(flat).nbytes
+            layout.append((name, part, typecode, size, nbytes))
+            size += nbytes
+
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for name, part, typecode, offset, nbytes in layout:
+        flat = getattr(inst, name) if part is None else getattr(getattr(inst, name), part)
+        block.buf[offset:offset + nbytes] = memoryview(flat).cast("B")
+
+    shared = copy.copy(inst)
+    for name in shared_matrices:
+        object.__setattr__(shared, name, None)
+    object.__setattr__(shared, "shared_block", (block.name, layout))
+    return block, shared
+
+
+def attachInstance(inst):
+    """
+    in a worker process: attaches the matrices of an instance shared by shareInstance() without copying them,
+    the matrices become memoryviews of the shared memory block; other instances are returned unchanged
+    """
+    if getattr(inst, "shared_block", None) is None or getattr(inst, shared_matrices[0]) is not None:
+        return inst
+    name, layout = inst.shared_block
+    if not attached_blocks:
+        atexit.register(detachInstances)
+    if name not in attached_blocks:
+        attached_blocks[name] = shared_memory.SharedMemory(name=name)
+    block = attached_blocks[name]
+    parts = {}
+    for matrix, part, typecode, offset, nbytes in layout:
+        view = block.buf[offset:offset + nbytes]
+        attached_views.append(view)
+        attached_views.append(view.cast(typecode))
+        if part is None:
+            object.__setattr__(inst, matrix, attached_views[-1])
+        else:
+            parts.setdefault(matrix, {})[part] = attached_views[-1]
+    for matrix, views in parts.items():
+        object.__setattr__(inst, matrix, RaggedArray(**views))
+    return inst
 
-# global variables
 
-unplacedEvents = []
+def detachInstances():
+    """
+    releases the views of all attached matrices and closes the shared memory blocks before the process exits;
+    the blocks are unlinked by the process which created them
+    """
+    for view in reversed(attached_views):
+        view.release()
+    del attached_views[:]
+    for block in attached_blocks.values():
+        block.close()
+    attached_blocks.clear()
 
 
-# List of courses with the same teacher,
-# dict mapping a teacher to all his courses
-teachers = {}
-for course in courses:
-    teacher = course.teacher
-    if teacher not in teachers:
-        teachers[teacher] = []
-    teachers[teacher].append(course.id)
+# the current instance, see useInstance()
+instance = None
 
 
-# Map the course_name to its index in "courses"
-courseNameToIndex = {}
-for i, course in enumerate(courses):
-    courseNameToIndex[course.id] = i
+def useInstance(inst):
+    """
+    make inst the current instance: its data is made available as the globals of this module,
+    which are used by all other modules; the timetable is reset
+    """
+    global instance, input_file, input_file_choice, header, courses, courseEvents, rooms, roomIndexToName, \
+        curricula, unavailability_constraints, room_constraints, numberOfTimeslots, numberOfRooms, \
+        mapTimeslotToDayAndPeriod, days, teachers, teacherNameToIndex, courseIndexToTeacher, courseNameToIndex, \
+        courseAvailability, curriculaToCourses, coursesToCurricula, curriculumIdToIndex, courseIndexToCurricula, \
+        conflictMatrix, conflictNeighbours, conflictingCourses, dayMasks, firstPeriodMask, lastPeriodMask, \
+        roomCapacityExcess
+    instance = inst
+    input_file = inst.input_file
+    input_file_choice = inst.input_file_choice
+    header = inst.header
+    courses = inst.courses
+    courseEvents = inst.courseEvents
+    rooms = inst.rooms
+    roomIndexToName = inst.roomIndexToName
+    curricula = inst.curricula
+    unavailability_constraints = inst.unavailability_constraints
+    room_constraints = inst.room_constraints
+    numberOfTimeslots = inst.numberOfTimeslots
+    numberOfRooms = inst.numberOfRooms
+    mapTimeslotToDayAndPeriod = inst.mapTimeslotToDayAndPeriod
+    days = inst.days
+    teachers = inst.teachers
+    teacherNameToIndex = inst.teacherNameToIndex
+    courseIndexToTeacher = inst.courseIndexToTeacher
+    courseNameToIndex = inst.courseNameToIndex
+    courseAvailability = inst.courseAvailability
+    curriculaToCourses = inst.curriculaToCourses
+    coursesToCurricula = inst.coursesToCurricula
+    curriculumIdToIndex = inst.curriculumIdToIndex
+    courseIndexToCurricula = inst.courseIndexToCurricula
+    conflictMatrix = inst.conflictMatrix
+    conflictNeighbours = inst.conflictNeighbours
+    conflictingCourses = inst.conflictingCourses
+    dayMasks = inst.dayMasks
+    firstPeriodMask = inst.firstPeriodMask
+    lastPeriodMask = inst.lastPeriodMask
+    roomCapacityExcess = inst.roomCapacityExcess
+
+    resetTimetable()
+
+
+def resetTimetable():
+    """
+    create an empty timetable for the current instance, all lectures are unassigned
+    """
+    global events, unplacedEvents, timetable, emptyPositions, freeRooms, \
+        timeslotCourseCount, timeslotTeacherCount, timeslotCurriculumCount, journal
 
+    # the unassigned lectures
+    events = [ev for ev in courseEvents for i in range(courses[ev.index].xx_num_lectures_initial)]
+    unplacedEvents = []
 
+    # create an empty timetable as a flat array of rooms * timeslots holding the course index
+    # of the assigned lecture (-1 for an empty position), create a set of empty positions (room, timeslot)
+    # and the set of free rooms of each timeslot; both are kept up to date by hard.setPosition()
+    timetable = array('h', [-1]) * (numberOfRooms * numberOfTimeslots)
+    # hard constraint: RoomOccupancy
+    emptyPositions = PositionSet((i, j) for i in range(numberOfRooms) for j in range(numberOfTimeslots))
+    freeRooms = [set(range(numberOfRooms)) for ts in range(numberOfTimeslots)]
 
-# mapping of the curriculum to the courses in the curriculum
-curriculaToCourses = {}
-for cu in curricula:
-    curriculaToCourses[cu.id] = cu.courses
+    # conflict counters per timeslot, kept up to date by hard.setPosition();
+    # the number of lectures of each course, teacher and curriculum assigned to the timeslot
+    timeslotCourseCount = [[0] * len(courses) for ts in range(numberOfTimeslots)]
+    timeslotTeacherCount = [[0] * len(teachers) for ts in range(numberOfTimeslots)]
+    timeslotCurriculumCount = [[0] * len(curricula) for ts in range(numberOfTimeslots)]
 
+    # journal of the assignments and removals ("assign"/"remove", event, position) of the current move,
+    # see hard.beginMove(); None if no move is recorded
+    journal = None
 
 
-# mapping of the course to all curricula containing the course
-coursesToCurricula = {}
-for course in courses:
-    coursesToCurricula[course.id] = []
-    for cu, cuList in curriculaToCourses.items():
-        if course.id in cuList:
-            coursesToCurricula[course.id].append(cu)
+def convertTimeslotToDayPeriod(timeslot):
+    """
+    returns the day and dayPeriod of a timeslot
+    """
+    day, period = mapTimeslotToDayAndPeriod[timeslot]
+    return day, period
 
 
+def getEvent(position, tt=None):
+    """
+    returns the event assigned to the position (room, timeslot) of the timetable tt
+    (default: the current timetable), None if the position is empty
+    """
+    if tt is None:
+        tt = timetable
+    c = tt[position[0] * numberOfTimeslots + position[1]]
+    if c < 0:
+        return None
+    return courseEvents[c]
 
-# create an empty timetable as a dictionary with (room, timeslot), create a list of empty positions (room, timeslot)
-timetable = {}
-emptyPositions = [] # hard constraint: RoomOccupancy
-for i in range(numberOfRooms):
-    for j in range(numberOfTimeslots):
-        emptyPositions.append((i, j))
-        timetable[(i, j)] = None
 
-forbiddenPositions = []
+def setEvent(position, event):
+    """
+    writes the event (or None) to the position of the current timetable;
+    does not update any counters, use hard.setPosition() instead
+    """
+    if event is None:
+        timetable[position[0] * numberOfTimeslots + position[1]] = -1
+    else:
+        timetable[position[0] * numberOfTimeslots + position[1]] = event.index
+
+
+def timetableItems(tt=None):
+    """
+    returns a list of all (position, event) pairs of the timetable tt (default: the current timetable);
+    event is None for empty positions
+    """
+    if tt is None:
+        tt = timetable
+    items = []
+    for i, c in enumerate(tt):
+        position = (i // numberOfTimeslots, i % numberOfTimeslots)
+        if c < 0:
+            items.append((position, None))
+        else:
+            items.append((position, courseEvents[c]))
+    return items
+
+
+def timetableBitsets(tt=None):
+    """
+    returns the occupancy of the timetable tt (default: the current timetable) as bitsets per course:
+    the timeslots (bit ts) and the rooms (bit room) of its lectures
+    """
+    if tt is None:
+        tt = timetable
+    timeslotMasks = [0] * len(courses)
+    roomMasks = [0] * len(courses)
+    for i, c in enumerate(tt):
+        if c >= 0:
+            timeslotMasks[c] |= 1 << (i % numberOfTimeslots)
+            roomMasks[c] |= 1 << (i // numberOfTimeslots)
+    return timeslotMasks, roomMasks
+
+
+def takeSnapshot():
+    """
+    returns a copy of the current timetable; a snapshot only holds the course indices
+    and is restored by hard.restoreSnapshot()
+    """
+    return timetable[:]
 
 
 def getEmptyPositions():
     empty = []
     for i in range(numberOfRooms):
         for j in range(numberOfTimeslots):
-            if timetable[(i, j)] is None:
+            if getEvent((i, j)) is None:
                 empty.append((i, j))
     return empty
 
@@ -401,16 +758,3 @@ def getCourseFromCourseName(courseName):
     returns the course given by the course name
     """
     return courses[courseNameToIndex[courseName]]
-
-
-##DEBUG
-print(header)
-# print(courses)
-# print(courses)
-# print(rooms)
-# print(roomIndexToName)
-# print(curricula)
-# # print(unavailability_constraints_org)
-# print(unavailability_constraints)
-# print(room_constraints)
-# print(mapTimeslotToDayAndPeriod)
@@ -24,16 +24,45 @@ import random
 
 import initialisation
 import misc
+import tabu
 import data
 import neighborhood
 import hard
-import construct
+import convergence
+import profiling
 
 
-best_distance = len(data.events)
-best_feasible_tt = copy.deepcopy(data.timetable)
+best_distance = 0
+best_feasible_tt = None
 
-last_distance = best_distance
+last_distance = 0
+
+
+def initialise():
+    """
+    start the search for feasibility from the current timetable
+    """
+    global best_distance, best_feasible_tt, last_distance
+    best_distance = len(data.events)
+    best_feasible_tt = data.takeSnapshot()
+
+    last_distance = best_distance
+
+
+def placeUnassignedEvents():
+    """
+    assign the unassigned events in random order to the first free position they fit into
+    """
+    random.shuffle(data.events)
+    events2 = copy.copy(data.events)
+
+    for ev in data.events:
+        pos = hard.findFreePosition(ev)
+        if pos is not None:
+            hard.assignCourseToPosition(ev, pos)
+            events2.remove(ev)
+
+    data.events = events2
 
 
 def swapTimeslots(T, tabu=False):
@@ -46,10 +75,14 @@ def swapTimeslots(T, tabu=False):
     """
     global last_distance, best_feasible_tt, best_distance
     ts1, ts2 = neighborhood.randomChose2timeslots()
+    if profiling.enabled:
+        profiling.countMove("timeslots", "attempted")
 
     if tabu:
         # if the move is on the tabu list, abort
         if (ts1, ts2) in T or (ts2, ts1) in T:
+            if profiling.enabled:
+                profiling.countMove("timeslots", "tabu")
             return False
         else:
             T.append((ts1, ts2))
@@ -61,14 +94,15 @@ def swapTimeslots(T, tabu=False):
     # for cu in data.curricula:
     #     init_cost+=soft.isolatedLectures(cu)
 
-    backupEvents = copy.copy(data.events)
-    # backupUnplaced = copy.copy(data.unplacedEvents)
-    backupEmptyPos = copy.copy(data.emptyPositions)
-    backupTT = copy.deepcopy(data.timetable)
+    # journal the assignments and removals of the move instead of backing up the whole state
+    hard.beginMove()
 
     successful, backup1, backup2 = neighborhood.swap2timeslots(ts1, ts2, preserve_feasibility=False)
 
     if not successful:
+        hard.commitMove()
+        if profiling.enabled:
+            profiling.countMove("timeslots", "infeasible")
         return False
 
 
@@ -89,15 +123,7 @@ def swapTimeslots(T, tabu=False):
     #             data.events.append(ev)
 
     # try assigning the unplaced courses to empty positions
-    random.shuffle(data.events)
-    events2 = copy.copy(data.events)
-
-    for ev in data.events:
-        for pos in data.emptyPositions:
-            if hard.courseFitsIntoTimeslot(ev, pos[1]):
-                hard.assignCourseToPosition(ev, pos)
-                events2.remove(ev)
-                break
+    placeUnassignedEvents()
 
     # new_cost=0
     # for course in data.courses:
@@ -108,7 +134,6 @@ def swapTimeslots(T, tabu=False):
     # # compute the resulting cost change
     # delta_e=new_cost-init_cost
 
-    data.events = events2
     distance = len(data.events)
     delta_e = distance - last_distance
     # print(delta_e)
@@ -116,10 +141,7 @@ def swapTimeslots(T, tabu=False):
     if tabu:
         if delta_e > 0:
             # neighborhood.reverseSwapTimeslots(backup1, backup2, ts1, ts2)
-            data.events = backupEvents
-            # data.unplacedEvents = backupUnplaced
-            data.emptyPositions = backupEmptyPos
-            data.timetable = backupTT
+            hard.rollbackMove()
             return False
     else:
         # check if the new timetable is worse than the previous one
@@ -128,18 +150,18 @@ def swapTimeslots(T, tabu=False):
         # restore the previous state
         if delta_e > 0 and random.random() > math.exp(-delta_e / T):
             # neighborhood.reverseSwapTimeslots(backup1, backup2, ts1, ts2)
-            data.events = backupEvents
-            # data.unplacedEvents = backupUnplaced
-            data.emptyPositions = backupEmptyPos
-            data.timetable = backupTT
+            hard.rollbackMove()
             return False
 
-    # update the last cost value
+    # keep the changes, update the last cost value
+    hard.commitMove()
     last_distance = distance
+    if profiling.enabled:
+        profiling.countAccepted("timeslots", delta_e)
 
     # check if a new best has been found and save the best timetable
     if distance < best_distance:
-        best_feasible_tt = copy.deepcopy(data.timetable)
+        best_feasible_tt = data.takeSnapshot()
         best_distance = distance
         # misc.displayTimetable(data.timetable)
 
@@ -156,23 +178,28 @@ def swapPositions(T, tabu=False):
     """
     global last_distance, best_feasible_tt, best_distance
     pos1, pos2 = neighborhood.randomChose2positions()
+    if profiling.enabled:
+        profiling.countMove("positions", "attempted")
 
     if tabu:
         # if the move is on the tabu list, abort
         if (pos1, pos2) in T or (pos2, pos1) in T:
+            if profiling.enabled:
+                profiling.countMove("positions", "tabu")
             return False
         else:
             T.append((pos1, pos2))
             T.append((pos2, pos1))
 
-    backupEvents = copy.copy(data.events)
-    # backupUnplaced = copy.copy(data.unplacedEvents)
-    backupEmptyPos = copy.copy(data.emptyPositions)
-    backupTT = copy.deepcopy(data.timetable)
+    # journal the assignments and removals of the move instead of backing up the whole state
+    hard.beginMove()
 
     successful, backup1, backup2 = neighborhood.swap2eventPositions(pos1, pos2, preserve_feasibility=False)
 
     if not successful:
+        hard.commitMove()
+        if profiling.enabled:
+            profiling.countMove("positions", "infeasible")
         return False
 
     # check if the new assignments are feasible; if not remove the event
@@ -187,17 +214,8 @@ def swapPositions(T, tabu=False):
 
 
     # try assigning the unplaced courses to empty positions
-    random.shuffle(data.events)
-    events2 = copy.copy(data.events)
-
-    for ev in data.events:
-        for pos in data.emptyPositions:
-            if hard.courseFitsIntoTimeslot(ev, pos[1]):
-                hard.assignCourseToPosition(ev, pos)
-                events2.remove(ev)
-                break
+    placeUnassignedEvents()
 
-    data.events = events2
     distance = len(data.events)
     delta_e = distance - last_distance
     # print(delta_e)
@@ -205,10 +223,7 @@ def swapPositions(T, tabu=False):
     if tabu:
         if delta_e > 0:
             # neighborhood.reverseSwapPositions(backup1, backup2)
-            data.events = backupEvents
-            # data.unplacedEvents = backupUnplaced
-            data.emptyPositions = backupEmptyPos
-            data.timetable = backupTT
+            hard.rollbackMove()
             return False
     else:
         # check if the new timetable is worse than the previous one
@@ -217,25 +232,90 @@ def swapPositions(T, tabu=False):
         # restore the previous state
         if delta_e > 0 and random.random() > math.exp(-delta_e / T):
             # neighborhood.reverseSwapPositions(backup1, backup2)
-            data.events = backupEvents
-            # data.unplacedEvents = backupUnplaced
-            data.emptyPositions = backupEmptyPos
-            data.timetable = backupTT
+            hard.rollbackMove()
             return False
 
-    # update the last cost value
+    # keep the changes, update the last cost value
+    hard.commitMove()
     last_distance = distance
+    if profiling.enabled:
+        profiling.countAccepted("positions", delta_e)
     # misc.displayTimetable(data.timetable)
 
     # check if a new best has been found and save the best timetable
     if distance < best_distance:
-        best_feasible_tt = copy.deepcopy(data.timetable)
+        best_feasible_tt = data.takeSnapshot()
         best_distance = distance
         # misc.displayTimetable(data.timetable)
 
     return True
 
 
+def swapKempe(T, tabu=False):
+    """
+    swaps a Kempe chain between 2 timeslots, which keeps all assignments feasible,
+    then tries to assign the unassigned events to the rearranged timetable
+
+    default mode: simulated annealing
+    extra mode: tabu search
+    """
+    global last_distance, best_feasible_tt, best_distance
+    position = neighborhood.randomLecture()
+    if position is None:
+        return False
+    ts2 = random.randrange(data.numberOfTimeslots - 1)
+    ts2 += ts2 >= position[1]
+    if profiling.enabled:
+        profiling.countMove("kempe", "attempted")
+
+    if tabu:
+        # if the move is on the tabu list, abort
+        if (position, ts2) in T:
+            if profiling.enabled:
+                profiling.countMove("kempe", "tabu")
+            return False
+        else:
+            T.append((position, ts2))
+
+    changes = neighborhood.kempeChanges(position, ts2)
+    if changes is None:
+        if profiling.enabled:
+            profiling.countMove("kempe", "infeasible")
+        return False
+
+    # journal the assignments and removals of the move instead of backing up the whole state
+    hard.beginMove()
+    neighborhood.applyKempe(changes)
+
+    # try assigning the unplaced courses to empty positions
+    placeUnassignedEvents()
+
+    distance = len(data.events)
+    delta_e = distance - last_distance
+
+    if tabu:
+        if delta_e > 0:
+            hard.rollbackMove()
+            return False
+    else:
+        if delta_e > 0 and random.random() > math.exp(-delta_e / T):
+            hard.rollbackMove()
+            return False
+
+    # keep the changes, update the last cost value
+    hard.commitMove()
+    last_distance = distance
+    if profiling.enabled:
+        profiling.countAccepted("kempe", delta_e)
+
+    # check if a new best has been found and save the best timetable
+    if distance < best_distance:
+        best_feasible_tt = data.takeSnapshot()
+        best_distance = distance
+
+    return True
+
+
 def tabu_search_hard(tabu_length):
     """
     reduce the distance to feasibility of the timetable
@@ -243,32 +323,23 @@ def tabu_search_hard(tabu_length):
 
     returns smallest distance and best timetable
     """
-    startingTime = time.clock()
-
-    tabu_timeslots = []
-    tabu_positions = []
+    tabu_timeslots = tabu.TabuList(tabu_length)
+    tabu_positions = tabu.TabuList(tabu_length)
+    tabu_kempe = tabu.TabuList(tabu_length)
 
     iterations = 0
 
-    while best_distance > 0 and time.clock() - data.starting_time < initialisation.max_runtime: #initialisation.TL_feasibility: #iterations < 30000:
-
-        # iterations += 1
-
-        # display current cost every 5 seconds
-        if time.clock() - startingTime > 5:
-            startingTime += 5
-            initialisation.distance_over_time.append(best_distance)
-            # print("Current distance: " + str(best_distance))
+    # initialisation.TL_feasibility: #iterations < 30000:
+    while best_distance > 0 and time.perf_counter() - data.starting_time < data.max_runtime:
 
-        # update the tabu lists
-        if len(tabu_timeslots) > tabu_length:
-            tabu_timeslots.pop(0)
+        iterations += 1
 
-        if len(tabu_positions) > tabu_length:
-            tabu_positions.pop(0)
+        # write the convergence trace
+        if convergence.enabled and time.perf_counter() >= convergence.next_time:
+            convergence.record("feasibility", iterations, last_distance, best_distance, tabu_length)
 
         # select a random neighborhood move
-        x = random.randrange(2)
+        x = random.randrange(3)
 
         # test: neighborhood
         # x = initialisation.nh_f
@@ -277,8 +348,10 @@ def tabu_search_hard(tabu_length):
 
         if x == 0:
             change = swapTimeslots(tabu_timeslots, tabu=True)
-        else:
+        elif x == 1:
             change = swapPositions(tabu_positions, tabu=True)
+        else:
+            change = swapKempe(tabu_kempe, tabu=True)
 
 
     # print("num iterations: ", str(iterations))
@@ -292,8 +365,8 @@ def simulated_annealing_hard(Tmax, Tmin, steps):
 
     returns smallest distance and best timetable
     """
-    startingTime = time.clock()
-    # while (time.clock() - startingTime) < 15:
+    startingTime = time.perf_counter()
+    # while (time.perf_counter() - startingTime) < 15:
 
     step = 0
     # Precompute factor for exponential cooling from Tmax to Tmin
@@ -303,30 +376,32 @@ def simulated_annealing_hard(Tmax, Tmin, steps):
 
     iterations = 0
 
-    while best_distance > 0 and time.clock() - startingTime < initialisation.TL_feasibility: #iterations < 30000:# time.clock() < data.timelimit:
-        # iterations += 1
+    # iterations < 30000:# time.perf_counter() < data.timelimit:
+    while best_distance > 0 and time.perf_counter() - startingTime < initialisation.TL_feasibility:
+        iterations += 1
         # misc.displayTimetable(data.timetable)
         #if local optima has been found, reset temperature
         if no_improvement > 10:
             step = 0
 
-        # display current cost every 5 seconds
-        # if time.clock() - startingTime > 5:
-        #     startingTime += 5
-        #     print("Current distance: " + str(last_distance))
-
         T = Tmax * math.exp(Tfactor * step / steps)
 
+        # write the convergence trace
+        if convergence.enabled and time.perf_counter() >= convergence.next_time:
+            convergence.record("feasibility", iterations, last_distance, best_distance, T)
+
         if T > Tmin:
             step += 1
 
         # select a random neighborhood move
-        x = random.randrange(2)
+        x = random.randrange(3)
 
         if x == 0:
             change = swapTimeslots(T)
-        else:
+        elif x == 1:
             change = swapPositions(T)
+        else:
+            change = swapKempe(T)
 
         # check if a local optimum has been found
         if not change:
@@ -337,16 +412,27 @@ def simulated_annealing_hard(Tmax, Tmin, steps):
     return (best_distance, best_feasible_tt)
 
 
-if construct.distanceToFeasibility > 0:
-    if initialisation.searchType == "TS":
-        feasibility_time, tmp = misc.timedcall(tabu_search_hard, initialisation.tabu_length)
-        best_distance, best_feasible_tt = tmp
-        data.timetable = best_feasible_tt
+def reachFeasibility(distanceToFeasibility):
+    """
+    reduce the distance to feasibility of the constructed timetable;
+    the best timetable found becomes the current timetable
+
+    returns the time needed in seconds and the smallest distance
+    """
+    global best_distance, best_feasible_tt
+    initialise()
+    if distanceToFeasibility > 0:
+        if initialisation.searchType == "TS":
+            feasibility_time, tmp = misc.timedcall(tabu_search_hard, initialisation.tabu_length)
+            best_distance, best_feasible_tt = tmp
+            hard.restoreSnapshot(best_feasible_tt)
+        else:
+            feasibility_time, tmp = misc.timedcall(simulated_annealing_hard, initialisation.Tmax, initialisation.Tmin,
+                                                   initialisation.steps)
+            best_distance, best_feasible_tt = tmp
+            hard.restoreSnapshot(best_feasible_tt)
     else:
-        feasibility_time, tmp = misc.timedcall(simulated_annealing_hard, initialisation.Tmax, initialisation.Tmin,
-                                               initialisation.steps)
-        best_distance, best_feasible_tt = tmp
-        data.timetable = best_feasible_tt
-else:
-    best_distance = construct.distanceToFeasibility
-    feasibility_time = 0
\ No newline at end of file
+        best_distance = distanceToFeasibility
+        feasibility_time = 0
+
+    return feasibility_time, best_distance
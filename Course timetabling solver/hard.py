@@ -29,10 +29,7 @@ def teacherIsAvailable(event, timeslot):
     if event is None:
         return True
 
-    for constraint in data.unavailability_constraints:
-        if event.id == constraint.courseID and timeslot == constraint.timeslot:
-            return False
-    return True
+    return data.courseAvailability[event.index * data.numberOfTimeslots + timeslot] == 1
 
 
 # hard constraint: Lectures (part 2 of 2)
@@ -44,11 +41,7 @@ def timeslotHasSameLecture(event, timeslot):
     if event is None:
         return False
 
-    for room in range(data.numberOfRooms):
-        if not data.timetable[(room, timeslot)] is None:
-            if data.timetable[(room, timeslot)].id == event.id:
-                return True
-    return False
+    return data.timeslotCourseCount[timeslot][event.index] > 0
 
 
 def timeslotHasSameTeacher(event, timeslot):
@@ -59,12 +52,7 @@ def timeslotHasSameTeacher(event, timeslot):
     if event is None:
         return False
 
-    for room in range(data.numberOfRooms):
-        currentEv = data.timetable[(room, timeslot)] # is the current course also taught by this teacher?
-        if not currentEv is None:
-            if currentEv.id in data.teachers[event.teacher]:
-                return True
-    return False
+    return data.timeslotTeacherCount[timeslot][data.courseIndexToTeacher[event.index]] > 0
 
 
 def timeslotHasSameCurriculum(event, timeslot):
@@ -75,24 +63,184 @@ def timeslotHasSameCurriculum(event, timeslot):
     if event is None:
         return False
 
-    curriculaOfEvent = data.coursesToCurricula[event.id]   # which curricula is this course part of?
-    for room in range(data.numberOfRooms):
-        currentEv = data.timetable[(room, timeslot)]
-        if not currentEv is None:
-            for cu in curriculaOfEvent:    # checks whether the current course is also part of the same curriculum
-                if currentEv.id in data.curriculaToCourses[cu]:
-                    return True
+    curriculumCount = data.timeslotCurriculumCount[timeslot]
+    for cu in data.courseIndexToCurricula[event.index]:    # which curricula is this course part of?
+        if curriculumCount[cu] > 0:
+            return True
     return False
 
 
+def addToConflictCounters(event, timeslot):
+    """
+    count the event in the conflict counters of the timeslot
+    """
+    data.timeslotCourseCount[timeslot][event.index] += 1
+    data.timeslotTeacherCount[timeslot][data.courseIndexToTeacher[event.index]] += 1
+    curriculumCount = data.timeslotCurriculumCount[timeslot]
+    for cu in data.courseIndexToCurricula[event.index]:
+        curriculumCount[cu] += 1
+
+
+def removeFromConflictCounters(event, timeslot):
+    """
+    remove the event from the conflict counters of the timeslot
+    """
+    data.timeslotCourseCount[timeslot][event.index] -= 1
+    data.timeslotTeacherCount[timeslot][data.courseIndexToTeacher[event.index]] -= 1
+    curriculumCount = data.timeslotCurriculumCount[timeslot]
+    for cu in data.courseIndexToCurricula[event.index]:
+        curriculumCount[cu] -= 1
+
+
+def swapTimeslotCounters(ts1, ts2):
+    """
+    swap the conflict counters and the free rooms of 2 timeslots,
+    after all events of both timeslots have been swapped
+    """
+    for counters in (data.timeslotCourseCount, data.timeslotTeacherCount, data.timeslotCurriculumCount,
+                     data.freeRooms):
+        counters[ts1], counters[ts2] = counters[ts2], counters[ts1]
+
+    # only the rooms which are free in exactly one of the timeslots change their empty positions
+    for room in data.freeRooms[ts1] ^ data.freeRooms[ts2]:
+        if room in data.freeRooms[ts1]:
+            data.emptyPositions.remove((room, ts2))
+            data.emptyPositions.add((room, ts1))
+        else:
+            data.emptyPositions.remove((room, ts1))
+            data.emptyPositions.add((room, ts2))
+
+
+def rebuildEmptyPositions():
+    """
+    recompute the empty positions and the free rooms of all timeslots, after data.timetable has been replaced
+    """
+    data.emptyPositions = data.PositionSet()
+    data.freeRooms = [set() for ts in range(data.numberOfTimeslots)]
+    for (room, ts), ev in data.timetableItems():
+        if ev is None:
+            data.emptyPositions.add((room, ts))
+            data.freeRooms[ts].add(room)
+
+
+def countViolations(tt=None):
+    """
+    returns the number of violations of the hard constraints in the timetable tt (default: the current timetable),
+    counted like validator.cc does: missing lectures, lectures of conflicting courses in the same timeslot and
+    lectures in unavailable timeslots (a room holds only one lecture);
+    evaluated on the bitsets of the timetable, see data.timetableBitsets()
+    """
+    if tt is None:
+        tt = data.timetable
+    timeslotMasks, roomMasks = data.timetableBitsets(tt)
+
+    T = data.numberOfTimeslots
+    violations = 0
+    for c, course in enumerate(data.courses):
+        mask = timeslotMasks[c]
+        violations += abs(course.num_lectures - mask.bit_count())
+        while mask:
+            ts = (mask & -mask).bit_length() - 1
+            violations += not data.courseAvailability[c * T + ts]
+            mask &= mask - 1
+    for c1, c2 in data.conflictingCourses:
+        violations += (timeslotMasks[c1] & timeslotMasks[c2]).bit_count()
+    return violations
+
+
+def findFreePosition(event):
+    """
+    returns the first empty position whose timeslot the event fits into, None if there is none
+    """
+    for ts in range(data.numberOfTimeslots):
+        if data.freeRooms[ts] and courseFitsIntoTimeslot(event, ts):
+            for room in data.freeRooms[ts]:
+                return room, ts
+    return None
+
+
+def rebuildConflictCounters():
+    """
+    recount the conflict counters of all timeslots, after data.timetable has been replaced
+    """
+    for ts in range(data.numberOfTimeslots):
+        data.timeslotCourseCount[ts] = [0] * len(data.courses)
+        data.timeslotTeacherCount[ts] = [0] * len(data.teachers)
+        data.timeslotCurriculumCount[ts] = [0] * len(data.curricula)
+    for (room, ts), ev in data.timetableItems():
+        if ev is not None:
+            addToConflictCounters(ev, ts)
+
+
+def setPosition(position, event):
+    """
+    write the event (or None) to the position in the timetable and update the conflict counters
+    and the empty positions; every change of data.timetable has to go through this function
+    """
+    room, ts = position
+    old = data.getEvent(position)
+    if old is not None:
+        removeFromConflictCounters(old, ts)
+    elif event is not None:
+        data.emptyPositions.remove(position)
+        data.freeRooms[ts].remove(room)
+    data.setEvent(position, event)
+    if event is not None:
+        addToConflictCounters(event, ts)
+    elif old is not None:
+        data.emptyPositions.add(position)
+        data.freeRooms[ts].add(room)
+
+
+def beginMove():
+    """
+    start a journal of all assignments and removals of the following move, so it can be rolled back
+    """
+    data.journal = []
+
+
+def commitMove():
+    """
+    keep all changes since beginMove() and close the journal
+    """
+    data.journal = None
+
+
+def rollbackMove():
+    """
+    undo all assignments and removals since beginMove() in reverse order and close the journal;
+    the timetable, the empty positions and the unassigned events are restored,
+    the cost scales with the size of the move, not with the size of the timetable
+    """
+    journal = data.journal
+    data.journal = None
+    for operation, ev, position in reversed(journal):
+        if operation == "assign":
+            setPosition(position, None)
+            data.events.append(ev)
+        else:
+            setPosition(position, ev)
+            data.events.remove(ev)
+
+
+def restoreSnapshot(snapshot):
+    """
+    make a snapshot taken by data.takeSnapshot() the current timetable;
+    the conflict counters and the list of empty positions are recomputed
+    """
+    data.timetable[:] = snapshot
+    rebuildConflictCounters()
+    rebuildEmptyPositions()
+
+
 def assignCourseToPosition(course, position):
     """
     assign the course to the position in the timetable
     """
     # if data.timetable[position] is None and courseFitsIntoTimeslot(course, position[1]):
-    data.timetable[position] = course
-    data.emptyPositions.remove(position)
-    data.forbiddenPositions.append(position)
+    setPosition(position, course)
+    if data.journal is not None:
+        data.journal.append(("assign", course, position))
 
 
 def removeCourseAtPosition(position):
@@ -101,10 +249,11 @@ def removeCourseAtPosition(position):
     and add it to unassigned events
     returns the removed course
     """
-    ev = data.timetable[position]
+    ev = data.getEvent(position)
     if not ev is None:
-        data.timetable[position] = None
-        data.emptyPositions.append(position)
+        setPosition(position, None)
+        if data.journal is not None:
+            data.journal.append(("remove", ev, position))
 
     return ev
 
@@ -113,3 +262,29 @@ def courseFitsIntoTimeslot(course, timeslot):
     return not timeslotHasSameLecture(course, timeslot) and teacherIsAvailable(course, timeslot) \
                and not timeslotHasSameTeacher(course, timeslot) and not timeslotHasSameCurriculum(course, timeslot)
 
+
+def courseFitsIntoTimeslotReplacing(course, timeslot, leaving):
+    """
+    returns True if the course fits into the timeslot once the event leaving (may be None) has left it;
+    the counters are not changed
+    """
+    if not teacherIsAvailable(course, timeslot):
+        return False
+    c = course.index
+    if leaving is None:
+        return not timeslotHasSameLecture(course, timeslot) and not timeslotHasSameTeacher(course, timeslot) \
+            and not timeslotHasSameCurriculum(course, timeslot)
+    l = leaving.index
+
+    if data.timeslotCourseCount[timeslot][c] - (c == l) > 0:
+        return False
+    teacher = data.courseIndexToTeacher[c]
+    if data.timeslotTeacherCount[timeslot][teacher] - (teacher == data.courseIndexToTeacher[l]) > 0:
+        return False
+    curriculumCount = data.timeslotCurriculumCount[timeslot]
+    leavingCurricula = data.courseIndexToCurricula[l]
+    for cu in data.courseIndexToCurricula[c]:
+        if curriculumCount[cu] - (cu in leavingCurricula) > 0:
+            return False
+    return True
+
@@ -19,7 +19,6 @@ __author__ = 'Stephan Becker'
 
 import random
 import time
-import copy
 import math
 
 import data
@@ -27,13 +26,46 @@ import neighborhood
 import soft
 import initialisation
 import misc
+import tabu
+import profiling
+import convergence
 # import feasibility
 
 
-best_cost = soft.totalCostTimetable()
-best_feasible_tt = copy.deepcopy(data.timetable)
+best_cost = 0
+best_feasible_tt = None
+# seconds since the start of the run when the best timetable was found
+best_time = 0
 
-last_cost = best_cost
+last_cost = 0
+
+# number of neighborhood moves tried since initialise()
+moves_tried = 0
+
+
+def initialise():
+    """
+    start the improvement from the current timetable
+    """
+    global best_cost, best_feasible_tt, best_time, last_cost, moves_tried
+    best_cost = soft.totalCostTimetable()
+    soft.initialiseCostState()
+    best_feasible_tt = data.takeSnapshot()
+    best_time = time.perf_counter() - data.starting_time
+
+    last_cost = best_cost
+    moves_tried = 0
+
+
+def saveIfBest():
+    """
+    save the current timetable if it is a new best
+    """
+    global best_cost, best_feasible_tt, best_time
+    if last_cost < best_cost:
+        best_feasible_tt = data.takeSnapshot()
+        best_cost = last_cost
+        best_time = time.perf_counter() - data.starting_time
 
 # misc.displayTimetable(data.timetable)
 
@@ -46,12 +78,17 @@ def swapTimeslots(T, tabu=False):
     default mode: simulated annealing
     extra mode: tabu search
     """
-    global last_cost, best_feasible_tt, best_cost
+    global last_cost
     ts1, ts2 = neighborhood.randomChose2timeslots()
 
+    if profiling.enabled:
+        profiling.countMove("timeslots", "attempted")
+
     if tabu:
         # if the move is on the tabu list, abort
         if (ts1, ts2) in T or (ts2, ts1) in T:
+            if profiling.enabled:
+                profiling.countMove("timeslots", "tabu")
             return False
         else:
             T.append((ts1, ts2))
@@ -66,6 +103,8 @@ def swapTimeslots(T, tabu=False):
     successful, backup1, backup2 = neighborhood.swap2timeslots(ts1, ts2, preserve_feasibility=True)
 
     if not successful:
+        if profiling.enabled:
+            profiling.countMove("timeslots", "infeasible")
         return False
 
     # new_cost=0
@@ -77,8 +116,10 @@ def swapTimeslots(T, tabu=False):
     # # compute the resulting cost change
     # delta_e=new_cost-init_cost
 
-    total_cost = soft.totalCostTimetable()
-    delta_e = total_cost - last_cost
+    # compute the resulting cost change from the cost state, the timetable is not rescanned
+    changes = soft.changesSwapTimeslots(backup1, backup2, ts1, ts2)
+    delta_e = soft.deltaCost(changes)
+    total_cost = last_cost + delta_e
 
     if tabu:
         if delta_e > 0:
@@ -93,13 +134,14 @@ def swapTimeslots(T, tabu=False):
             neighborhood.reverseSwapTimeslots(backup1, backup2, ts1, ts2)
             return False
 
-    # update the last cost value
+    # update the cost state and the last cost value
+    soft.applyChanges(changes)
     last_cost = total_cost
+    if profiling.enabled:
+        profiling.countAccepted("timeslots", delta_e)
 
     # check if a new best has been found and save the best timetable
-    if total_cost < best_cost:
-        best_feasible_tt = copy.deepcopy(data.timetable)
-        best_cost = total_cost
+    saveIfBest()
 
     return True
 
@@ -112,12 +154,17 @@ def swapPositions(T, tabu=False):
     default mode: simulated annealing
     extra mode: tabu search
     """
-    global last_cost, best_feasible_tt, best_cost
+    global last_cost
     pos1, pos2 = neighborhood.randomChose2positions()
 
+    if profiling.enabled:
+        profiling.countMove("positions", "attempted")
+
     if tabu:
         # if the move is on the tabu list, abort
         if (pos1, pos2) in T or (pos2, pos1) in T:
+            if profiling.enabled:
+                profiling.countMove("positions", "tabu")
             return False
         else:
             T.append((pos1, pos2))
@@ -126,10 +173,14 @@ def swapPositions(T, tabu=False):
     successful, backup1, backup2 = neighborhood.swap2eventPositions(pos1, pos2)
 
     if not successful:
+        if profiling.enabled:
+            profiling.countMove("positions", "infeasible")
         return False
 
-    total_cost = soft.totalCostTimetable()
-    delta_e = total_cost - last_cost
+    # compute the resulting cost change from the cost state, the timetable is not rescanned
+    changes = soft.changesSwapPositions(backup1, backup2)
+    delta_e = soft.deltaCost(changes)
+    total_cost = last_cost + delta_e
 
     if tabu:
         if delta_e > 0:
@@ -144,13 +195,14 @@ def swapPositions(T, tabu=False):
             neighborhood.reverseSwapPositions(backup1, backup2)
             return False
 
-    # update the last cost value
+    # update the cost state and the last cost value
+    soft.applyChanges(changes)
     last_cost = total_cost
+    if profiling.enabled:
+        profiling.countAccepted("positions", delta_e)
 
     # check if a new best has been found and save the best timetable
-    if total_cost < best_cost:
-        best_feasible_tt = copy.deepcopy(data.timetable)
-        best_cost = total_cost
+    saveIfBest()
 
     return True
 
@@ -163,13 +215,18 @@ def swapRooms(T, tabu=False):
     default mode: simulated annealing
     extra mode: tabu search
     """
-    global last_cost, best_feasible_tt, best_cost
+    global last_cost
     r1, r2 = neighborhood.randomChose2rooms()
     ts = random.randrange(data.numberOfTimeslots)
 
+    if profiling.enabled:
+        profiling.countMove("rooms", "attempted")
+
     if tabu:
         # if the move is on the tabu list, abort
         if (r1, r2, ts) in T or (r2, r1, ts) in T:
+            if profiling.enabled:
+                profiling.countMove("rooms", "tabu")
             return False
         else:
             T.append((r1, r2, ts))
@@ -178,10 +235,14 @@ def swapRooms(T, tabu=False):
     successful, backup1, backup2 = neighborhood.swap2eventRooms(r1, r2, ts)
 
     if not successful:
+        if profiling.enabled:
+            profiling.countMove("rooms", "infeasible")
         return False
 
-    total_cost = soft.totalCostTimetable()
-    delta_e = total_cost - last_cost
+    # compute the resulting cost change from the cost state, the timetable is not rescanned
+    changes = soft.changesSwapRooms(backup1, backup2, ts)
+    delta_e = soft.deltaCost(changes)
+    total_cost = last_cost + delta_e
 
     if tabu:
         if delta_e > 0:
@@ -196,16 +257,249 @@ def swapRooms(T, tabu=False):
             neighborhood.reverseSwapRooms(backup1, backup2, ts)
             return False
 
-    # update the last cost value
+    # update the cost state and the last cost value
+    soft.applyChanges(changes)
     last_cost = total_cost
+    if profiling.enabled:
+        profiling.countAccepted("rooms", delta_e)
 
     # check if a new best has been found and save the best timetable
-    if total_cost < best_cost:
-        best_feasible_tt = copy.deepcopy(data.timetable)
-        best_cost = total_cost
+    saveIfBest()
+    return True
+
+
+def swapKempe(T, tabu=False):
+    """
+    relevant costs for Kempe chain swapping:
+    all, the lectures of the chain change their timeslots and rooms
+
+    default mode: simulated annealing
+    extra mode: tabu search
+    """
+    global last_cost
+    position = neighborhood.randomLecture()
+    if position is None:
+        return False
+    ts2 = random.randrange(data.numberOfTimeslots - 1)
+    ts2 += ts2 >= position[1]
+
+    if profiling.enabled:
+        profiling.countMove("kempe", "attempted")
+
+    if tabu:
+        # if the move is on the tabu list, abort
+        if (position, ts2) in T:
+            if profiling.enabled:
+                profiling.countMove("kempe", "tabu")
+            return False
+        else:
+            T.append((position, ts2))
+
+    changes = neighborhood.kempeChanges(position, ts2)
+    if changes is None:
+        if profiling.enabled:
+            profiling.countMove("kempe", "infeasible")
+        return False
+
+    # the cost change is computed from the cost state before the move is applied
+    delta_e = soft.deltaCost(changes)
+
+    if tabu:
+        if delta_e > 0:
+            return False
+    else:
+        if delta_e > 0 and random.random() > math.exp(-delta_e / T):
+            return False
+
+    neighborhood.applyKempe(changes)
+    soft.applyChanges(changes)
+    last_cost += delta_e
+    if profiling.enabled:
+        profiling.countAccepted("kempe", delta_e)
+
+    saveIfBest()
+    return True
+
+
+def bestSampledMove(tabu_lists, sample_size):
+    """
+    applies the best of sample_size randomly chosen feasible moves which is not tabu, even if it is worse;
+    a tabu move is allowed if it leads to a new best timetable (aspiration)
+
+    returns True if a move has been applied
+    """
+    global last_cost, moves_tried
+    moves = []
+    changes = []
+    for i in range(sample_size):
+        move = neighborhood.randomMove()
+        if profiling.enabled:
+            profiling.countMove(move[0], "attempted")
+        move_changes = neighborhood.feasibleChanges(move)
+        if move_changes is not None:
+            moves.append(move)
+            changes.append(move_changes)
+        elif profiling.enabled:
+            profiling.countMove(move[0], "infeasible")
+    moves_tried += sample_size
+    deltas = soft.deltaCosts(changes)
+
+    best = None
+    for i, move in enumerate(moves):
+        if move[1:] in tabu_lists[move[0]] and last_cost + deltas[i] >= best_cost:
+            if profiling.enabled:
+                profiling.countMove(move[0], "tabu")
+            continue
+        if best is None or deltas[i] < deltas[best]:
+            best = i
+
+    if best is None:
+        return False
+
+    move = moves[best]
+    neighborhood.applyMove(move, changes[best])
+    soft.applyChanges(changes[best])
+    last_cost += deltas[best]
+    if profiling.enabled:
+        profiling.countAccepted(move[0], deltas[best])
+
+    # the reverse move is tabu
+    T = tabu_lists[move[0]]
+    T.append(move[1:])
+    if move[0] == "rooms":
+        T.append((move[2], move[1], move[3]))
+    elif move[0] != "kempe":
+        T.append((move[2], move[1]))
+
+    saveIfBest()
+
     return True
 
 
+def candidateLectures():
+    """
+    returns the positions of the lectures which are part of a violation of a soft constraint:
+    RoomCapacity, MinWorkingDays or RoomStability of their course, or isolated in one of their curricula
+    """
+    T = data.numberOfTimeslots
+    R = data.numberOfRooms
+    periods = data.header.periods
+    positions = []
+    for i, c in enumerate(data.timetable):
+        if c < 0:
+            continue
+        room, ts = divmod(i, T)
+        if data.roomCapacityExcess[c * R + room] > 0 or soft.courseRoomsUsed[c] > 1 or \
+                soft.courseWorkingDays[c] < data.courses[c].minWorkingDays:
+            positions.append((room, ts))
+            continue
+        for cu in data.courseIndexToCurricula[c]:
+            count = soft.curriculumTimeslotCount[cu]
+            if not ((ts % periods > 0 and count[ts - 1] > 0) or (ts % periods < periods - 1 and count[ts + 1] > 0)):
+                positions.append((room, ts))
+                break
+    return positions
+
+
+def neighborhoodOfLecture(position):
+    """
+    returns all feasible moves of the lecture at the position to any other position of the timetable
+    and their changes: a room swap within its timeslot or a swap with the event (or the empty position)
+    at the other position
+    """
+    room, ts = position
+    moves = []
+    changes = []
+    for r in range(data.numberOfRooms):
+        for t in range(data.numberOfTimeslots):
+            if t == ts:
+                move = ("rooms", room, r, ts)
+            else:
+                move = ("positions", position, (r, t))
+            if t == ts and r == room:
+                continue
+            if profiling.enabled:
+                profiling.countMove(move[0], "attempted")
+            move_changes = neighborhood.feasibleChanges(move)
+            if move_changes is not None:
+                moves.append(move)
+                changes.append(move_changes)
+            elif profiling.enabled:
+                profiling.countMove(move[0], "infeasible")
+    return moves, changes
+
+
+def best_improvement_tabu_search(tabu_tenure, candidates):
+    """
+    tabu search which evaluates the complete neighborhood of up to candidates randomly chosen lectures
+    with a soft constraint violation (see candidateLectures()) and applies the best move which is not tabu,
+    even if it is worse; moving a course back into a timeslot it has left is tabu for
+    tabu_tenure plus a random number of up to tabu_tenure iterations, unless the move leads
+    to a new best timetable (aspiration)
+    runs until the time limit is reached or a perfect solution is found
+
+    returns best cost and best timetable
+    """
+    global last_cost, moves_tried
+    T = data.numberOfTimeslots
+    # [course * numberOfTimeslots + timeslot] iteration until which the course may not move into the timeslot
+    tabuUntil = [0] * (len(data.courses) * T)
+    iteration = 0
+
+    while best_cost > 0 and time.perf_counter() - data.starting_time < data.max_runtime:
+        iteration += 1
+
+        # write the convergence trace
+        if convergence.enabled and time.perf_counter() >= convergence.next_time:
+            convergence.record("improvement", iteration, last_cost, best_cost, tabu_tenure)
+
+        lectures = candidateLectures()
+        if len(lectures) > candidates:
+            lectures = random.sample(lectures, candidates)
+
+        moves = []
+        changes = []
+        for position in lectures:
+            lecture_moves, lecture_changes = neighborhoodOfLecture(position)
+            moves.extend(lecture_moves)
+            changes.extend(lecture_changes)
+        deltas = soft.deltaCosts(changes)
+        moves_tried += len(moves)
+
+        # best move which is not tabu, ties are broken randomly
+        best = []
+        best_delta = None
+        for i, move_changes in enumerate(changes):
+            if last_cost + deltas[i] >= best_cost and \
+                    any(tabuUntil[c * T + new_pos[1]] > iteration for c, old_pos, new_pos in move_changes):
+                if profiling.enabled:
+                    profiling.countMove(moves[i][0], "tabu")
+                continue
+            if best_delta is None or deltas[i] < best_delta:
+                best = [i]
+                best_delta = deltas[i]
+            elif deltas[i] == best_delta:
+                best.append(i)
+
+        if not best:
+            continue
+
+        i = random.choice(best)
+        neighborhood.applyMove(moves[i], changes[i])
+        soft.applyChanges(changes[i])
+        last_cost += deltas[i]
+        if profiling.enabled:
+            profiling.countAccepted(moves[i][0], deltas[i])
+
+        for c, old_pos, new_pos in changes[i]:
+            if old_pos[1] != new_pos[1]:
+                tabuUntil[c * T + old_pos[1]] = iteration + tabu_tenure + random.randrange(tabu_tenure + 1)
+
+        saveIfBest()
+
+    return (best_cost, best_feasible_tt)
+
+
 def simulated_annealing_soft(Tmax, Tmin, steps):
     """
     improve the soft constraints(total cost) of the timetable
@@ -213,8 +507,9 @@ def simulated_annealing_soft(Tmax, Tmin, steps):
 
     returns best cost and best timetable
     """
-    startingTime = time.clock()
-    # while (time.clock() - startingTime) < 15:
+    global moves_tried
+    startingTime = time.perf_counter()
+    # while (time.perf_counter() - startingTime) < 15:
 
     step = 0
     # Precompute factor for exponential cooling from Tmax to Tmin
@@ -224,31 +519,33 @@ def simulated_annealing_soft(Tmax, Tmin, steps):
 
     iterations = 0
 
-    while best_cost > 0 and time.clock() - startingTime < initialisation.TL_improvement: # iterations < 0:
-        # iterations += 1
+    while best_cost > 0 and time.perf_counter() - startingTime < initialisation.TL_improvement: # iterations < 0:
+        iterations += 1
 
         #if local optima has been found, reset temperature
         if no_improvement > 10:
             step = 0
 
-        # display current cost every 5 seconds
-        # if time.clock() - startingTime > 5:
-        #     startingTime += 5
-        #     print("Current total cost: " + str(last_cost))
-
         T = Tmax * math.exp(Tfactor * step / steps)
 
+        # write the convergence trace
+        if convergence.enabled and time.perf_counter() >= convergence.next_time:
+            convergence.record("improvement", iterations, last_cost, best_cost, T)
+
         if T > Tmin:
             step += 1
 
         # select a random neighborhood move
-        x = random.randrange(3)
+        moves_tried += 1
+        x = random.randrange(4)
         if x == 0:
             change = swapTimeslots(T)
         elif x == 1:
             change = swapPositions(T)
-        else:
+        elif x == 2:
             change = swapRooms(T)
+        else:
+            change = swapKempe(T)
 
         # check if a local optimum has been found
         if not change:
@@ -259,41 +556,48 @@ def simulated_annealing_soft(Tmax, Tmin, steps):
     return (best_cost, best_feasible_tt)
 
 
-def tabu_search_soft(tabu_length):
+def newTabuLists(tabu_length):
+    """
+    returns a tabu list of the given length for each neighborhood of the tabu search
+    """
+    return {"timeslots": tabu.TabuList(tabu_length), "positions": tabu.TabuList(tabu_length),
+            "rooms": tabu.TabuList(tabu_length), "kempe": tabu.TabuList(tabu_length)}
+
+
+def tabu_search_soft(tabu_length, tabu_lists=None):
     """
     improve the soft constraints(total cost) of the timetable
-    runs until the time limit is reached or a perfect solution is found
+    runs until the time limit is reached or a perfect solution is found;
+    tabu_lists (see newTabuLists()) continues with the tabu lists of an earlier call
 
     returns best cost and best timetable
     """
-    startingTime = time.clock()
-
-    tabu_timeslots = []
-    tabu_positions = []
-    tabu_rooms = []
+    global moves_tried
+    if tabu_lists is None:
+        tabu_lists = newTabuLists(tabu_length)
+    tabu_timeslots = tabu_lists["timeslots"]
+    tabu_positions = tabu_lists["positions"]
+    tabu_rooms = tabu_lists["rooms"]
+    tabu_kempe = tabu_lists["kempe"]
 
     iterations = 0
 
-    while best_cost > 0 and time.clock() - data.starting_time < initialisation.max_runtime: #initialisation.TL_improvement: # iterations < 0:
-        # iterations += 1
-
-        # display current cost every 5 seconds
-        if time.clock() - startingTime > 10:
-            startingTime += 10
-            initialisation.soft_score_over_time.append(best_cost)
-            # print("Current penalty: " + str(best_cost))
-
-        if len(tabu_timeslots) > tabu_length:
-            tabu_timeslots.pop(0)
+    # initialisation.TL_improvement: # iterations < 0:
+    while best_cost > 0 and time.perf_counter() - data.starting_time < data.max_runtime:
+        iterations += 1
 
-        if len(tabu_rooms) > tabu_length:
-            tabu_rooms.pop(0)
+        # write the convergence trace
+        if convergence.enabled and time.perf_counter() >= convergence.next_time:
+            convergence.record("improvement", iterations, last_cost, best_cost, tabu_length)
 
-        if len(tabu_positions) > tabu_length:
-            tabu_positions.pop(0)
+        # apply the best move of a sampled neighborhood
+        if initialisation.sample_size > 1:
+            bestSampledMove(tabu_lists, initialisation.sample_size)
+            continue
 
         # select a random neighborhood move
-        x = random.randrange(3)
+        moves_tried += 1
+        x = random.randrange(4)
 
         # test: neighborhood
         # x = initialisation.nh_i
@@ -317,17 +621,33 @@ def tabu_search_soft(tabu_length):
             change = swapPositions(tabu_positions, tabu=True)
         elif x == 2:
             change = swapRooms(tabu_rooms, tabu=True)
+        elif x == 3:
+            change = swapKempe(tabu_kempe, tabu=True)
 
     return (best_cost, best_feasible_tt)
 
 
-if initialisation.choice_inst != 0:
-    if initialisation.improveType == "TS":
-        improvement_time, tmp = misc.timedcall(tabu_search_soft, initialisation.tabu_length)
+def improveTimetable():
+    """
+    improve the soft constraints of the current timetable;
+    the toy instance is not improved
+
+    returns the time needed in seconds, the best cost and the best timetable
+    """
+    global best_cost
+    initialise()
+    if data.header.name != "toy":
+        if initialisation.improveType == "TS":
+            improvement_time, tmp = misc.timedcall(tabu_search_soft, initialisation.tabu_length)
+        elif initialisation.improveType == "BTS":
+            improvement_time, tmp = misc.timedcall(best_improvement_tabu_search, initialisation.tabu_tenure,
+                                                   initialisation.candidate_lectures)
+        else:
+            improvement_time, tmp = misc.timedcall(simulated_annealing_soft, initialisation.Tmax, initialisation.Tmin,
+                                                   initialisation.steps)
+        best_cost, best_tt = tmp
     else:
-        improvement_time, tmp = misc.timedcall(simulated_annealing_soft, initialisation.Tmax, initialisation.Tmin,
-                                               initialisation.steps)
-    best_cost, best_tt = tmp
-else:
-    best_tt = best_feasible_tt
-    improvement_time = 0
\ No newline at end of file
+        best_tt = best_feasible_tt
+        improvement_time = 0
+
+    return improvement_time, best_cost, best_tt
\ No newline at end of file
@@ -33,18 +33,52 @@ steps = 5
 
 tabu_length = 300
 
+# number of moves sampled in each iteration of the tabu search for the soft constraints;
+# the best one is applied. With 1, a single random move is applied only if it does not increase the cost
+sample_size = 1
+
+# number of worker processes; with more than 1, independent runs with different seeds
+# are started in parallel and the best timetable is kept
+workers = 1
+
+# parallel mode with more than 1 worker; "MS" = independent multi-start runs,
+# "IM" = island model: one tabu search per worker, the best timetables migrate every migration_interval seconds
+parallelType = "MS"
+migration_interval = 10
+
 searchType = "TS"
+# "TS" = tabu search, "BTS" = best improvement tabu search, otherwise simulated annealing
 improveType = "TS"
 
+# best improvement tabu search: tabu tenure in iterations and the number of lectures whose
+# complete neighborhood is evaluated in each iteration. the search is sampled: each iteration scans only the moves
+# of candidate_lectures randomly chosen lectures with a soft constraint violation, not the whole neighborhood;
+# a larger number scans more of it but makes each iteration slower. BTS converges more slowly than "TS":
+# on comp05 it reaches a mean soft cost of about 750 in 6 and in 30 seconds, "TS" about 520
+# (with all candidate lectures it reaches about 1180 in 6 seconds)
+tabu_tenure = 10
+candidate_lectures = 3
+
+# opt-in instrumentation of a run (see profiling.py): move counters per neighborhood and timers of the hot paths
+instrumentation = False
+# None, "cProfile" or "sampling"; the profile is written to the folder profiles
+profiler = None
+
+# construction; "DSatur" = each lecture goes to its best position,
+# "matching" = each lecture goes to its best timeslot, then the rooms of each timeslot are assigned by a matching
+constructType = "DSatur"
+
+# the construction places, ejects and re-places lectures until all are placed or TL_construction seconds have passed
 TL_construction = 90
-# construct currently loops once!
 
 # currently ignored
 TL_feasibility = 60
 TL_improvement = 30
 
-distance_over_time = []
-soft_score_over_time = []
+# convergence trace (see convergence.py): a record of the current and best cost every trace_interval seconds
+# is written to the folder traces
+trace = False
+trace_interval = 1.0
 
 
 # neighborhood feasibility; 0 = timeslot swap, 1 = event swap, 2 = random
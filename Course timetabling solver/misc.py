@@ -24,9 +24,9 @@ import data
 
 def timedcall(fn, *args):
     "Call function with args; return the time in seconds and result."
-    t0 = time.clock()
+    t0 = time.perf_counter()
     result = fn(*args)
-    t1 = time.clock()
+    t1 = time.perf_counter()
     return t1 - t0, result
 
 
@@ -50,6 +50,57 @@ def timedcalls(n, fn, *args):
     return min(times), average(times), max(times)
 
 
+def minimumCostAssignment(costs):
+    """
+    Hungarian method: assigns each row of the cost matrix costs (n rows, m >= n columns) to a different column
+    so that the sum of the costs is minimal; returns the column of each row
+    """
+    n, m = len(costs), len(costs[0])
+    # potentials of the rows and columns, row matched to each column (0 = none, rows are counted from 1)
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    match = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = [float("inf")] * (m + 1)
+        used = [False] * (m + 1)
+        while match[j0] != 0:
+            used[j0] = True
+            i0 = match[j0]
+            row = costs[i0 - 1]
+            delta = float("inf")
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+        # augment along the alternating path
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    assignment = [0] * n
+    for j in range(1, m + 1):
+        if match[j]:
+            assignment[match[j] - 1] = j - 1
+    return assignment
+
+
 def displayTimetable(tt):
     """
     draw a visual timetable into the console
@@ -60,9 +111,10 @@ def displayTimetable(tt):
     for room in range(data.numberOfRooms):
         print("Room: ", room, end="|")
         for ts in range(data.numberOfTimeslots):
-            if tt[(room, ts)] is None:
-                print(repr(tt[(room, ts)]).rjust(11), end="#")
+            ev = data.getEvent((room, ts), tt)
+            if ev is None:
+                print(repr(ev).rjust(11), end="#")
             else:
-                print(repr(tt[(room, ts)].id).rjust(11), end="#")
+                print(repr(ev.id).rjust(11), end="#")
                 # [print(repr(tt[(room, ts)]).rjust(11), end="#") for ts in range(numberOfTimeslots)]
         print(".")
\ No newline at end of file
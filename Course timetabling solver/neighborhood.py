@@ -21,6 +21,7 @@ import random
 
 import data
 import hard
+import soft
 
 
 def randomChose2timeslots():
@@ -68,8 +69,8 @@ def swap2timeslots(ts1, ts2, preserve_feasibility=True):
     returns True if feasibility is preserved;
     returns a backup of the events in the first timeslot and the second timeslot
     """
-    events_in_ts1 = [data.timetable[(i, ts1)] for i in range(data.numberOfRooms)]
-    events_in_ts2 = [data.timetable[(i, ts2)] for i in range(data.numberOfRooms)]
+    events_in_ts1 = [data.getEvent((i, ts1)) for i in range(data.numberOfRooms)]
+    events_in_ts2 = [data.getEvent((i, ts2)) for i in range(data.numberOfRooms)]
 
     if preserve_feasibility:
         # checks if no unavailability constraints are violated by the swap
@@ -111,10 +112,13 @@ def swap2timeslots(ts1, ts2, preserve_feasibility=True):
 
     else:
         for i, ev in enumerate(events_in_ts1):
-            data.timetable[(i, ts2)] = ev
+            data.setEvent((i, ts2), ev)
 
         for i, ev in enumerate(events_in_ts2):
-            data.timetable[(i, ts1)] = ev
+            data.setEvent((i, ts1), ev)
+
+        # all events of both timeslots are swapped, so are their conflict counters and free rooms
+        hard.swapTimeslotCounters(ts1, ts2)
 
     return True, events_in_ts1, events_in_ts2
 
@@ -129,8 +133,8 @@ def swap2eventPositions(pos1, pos2, preserve_feasibility=True):
     returns 2 tuples:
     returns a backup of the original positions of both events
     """
-    event_in_pos1 = data.timetable[pos1]
-    event_in_pos2 = data.timetable[pos2]
+    event_in_pos1 = data.getEvent(pos1)
+    event_in_pos2 = data.getEvent(pos2)
     # print(event_in_pos2)
     # print(event_in_pos1)
     # print(pos1,pos2)
@@ -143,15 +147,15 @@ def swap2eventPositions(pos1, pos2, preserve_feasibility=True):
         # checks if the events can be feasibly assigned to the other position
         # the possible new position is made empty, before it can be checked if the event can be assigned to this timeslot
         if not event_in_pos1 is None:
-            data.timetable[pos2] = None
+            hard.setPosition(pos2, None)
             assignmentPossible = hard.courseFitsIntoTimeslot(event_in_pos1, pos2[1])
-            data.timetable[pos2] = event_in_pos2
+            hard.setPosition(pos2, event_in_pos2)
             if not assignmentPossible:
                 return False, (None, None), (None, None)
         if not event_in_pos2 is None:
-            data.timetable[pos1] = None
+            hard.setPosition(pos1, None)
             assignmentPossible = hard.courseFitsIntoTimeslot(event_in_pos2, pos1[1])
-            data.timetable[pos1] = event_in_pos1
+            hard.setPosition(pos1, event_in_pos1)
             if not assignmentPossible:
                 return False, (None, None), (None, None)
 
@@ -171,8 +175,8 @@ def swap2eventPositions(pos1, pos2, preserve_feasibility=True):
                 data.events.append(event_in_pos2)
 
     else:
-        data.timetable[pos1] = event_in_pos2
-        data.timetable[pos2] = event_in_pos1
+        hard.setPosition(pos1, event_in_pos2)
+        hard.setPosition(pos2, event_in_pos1)
 
     return True, (pos1, event_in_pos1), (pos2, event_in_pos2)
 
@@ -186,8 +190,8 @@ def swap2eventRooms(r1, r2, timeslot):
     returns 2 tuples:
     returns a backup of the original rooms of both events
     """
-    event_in_r1 = data.timetable[(r1, timeslot)]
-    event_in_r2 = data.timetable[(r2, timeslot)]
+    event_in_r1 = data.getEvent((r1, timeslot))
+    event_in_r2 = data.getEvent((r2, timeslot))
 
     if (event_in_r1 is None and event_in_r2 is None) or event_in_r1 == event_in_r2:
         return False, (None, None), (None, None)
@@ -198,12 +202,190 @@ def swap2eventRooms(r1, r2, timeslot):
     # hard.assignCourseToPosition(event_in_r2,(r1, timeslot))
     # hard.assignCourseToPosition(event_in_r1,(r2, timeslot))
 
-    data.timetable[(r1, timeslot)] = event_in_r2
-    data.timetable[(r2, timeslot)] = event_in_r1
+    hard.setPosition((r1, timeslot), event_in_r2)
+    hard.setPosition((r2, timeslot), event_in_r1)
 
     return True, (r1, event_in_r1), (r2, event_in_r2)
 
 
+def randomLecture():
+    """
+    returns the position of a randomly chosen lecture of the timetable, None if the timetable is empty
+    """
+    if len(data.emptyPositions) == len(data.timetable):
+        return None
+    while True:
+        i = random.randrange(len(data.timetable))
+        if data.timetable[i] >= 0:
+            return divmod(i, data.numberOfTimeslots)
+
+
+def kempeChain(position, ts2):
+    """
+    returns the Kempe chain of the lecture at the position and the timeslot ts2: all lectures of both timeslots
+    which are connected to the lecture by a path of conflicts (data.conflictMatrix: same course, same teacher or
+    a common curriculum) between lectures of different timeslots
+
+    returns 2 lists of (room, event): the lectures of the chain in the timeslot of the position and in ts2
+    """
+    room, ts1 = position
+    T = data.numberOfTimeslots
+    C = len(data.courses)
+    chain = {ts1: [(room, data.getEvent(position))], ts2: []}
+    in_chain = {position}
+    queue = [position]
+    while queue:
+        r, ts = queue.pop()
+        conflicts = data.timetable[r * T + ts] * C
+        other = ts2 if ts == ts1 else ts1
+        for r2 in range(data.numberOfRooms):
+            c2 = data.timetable[r2 * T + other]
+            if c2 >= 0 and data.conflictMatrix[conflicts + c2] and (r2, other) not in in_chain:
+                in_chain.add((r2, other))
+                queue.append((r2, other))
+                chain[other].append((r2, data.courseEvents[c2]))
+    return chain[ts1], chain[ts2]
+
+
+def assignRooms(lectures, rooms):
+    """
+    assigns rooms to the lectures [(old room, event)], the biggest course first:
+    a lecture keeps its old room if it is available and big enough,
+    otherwise it gets the smallest available room which is big enough, or else the biggest available room
+
+    returns a list of (event, old room, new room)
+    """
+    rooms = set(rooms)
+    assignment = []
+    for old_room, ev in sorted(lectures, key=lambda lecture: -lecture[1].num_students):
+        if old_room in rooms and data.rooms[old_room].capacity >= ev.num_students:
+            room = old_room
+        else:
+            fitting = [r for r in rooms if data.rooms[r].capacity >= ev.num_students]
+            if fitting:
+                room = min(fitting, key=lambda r: data.rooms[r].capacity)
+            else:
+                room = max(rooms, key=lambda r: data.rooms[r].capacity)
+        rooms.remove(room)
+        assignment.append((ev, old_room, room))
+    return assignment
+
+
+def kempeChanges(position, ts2):
+    """
+    returns the changes of swapping the Kempe chain of the lecture at the position and the timeslot ts2
+    between both timeslots, see soft.deltaCost(); the moved lectures get new rooms by assignRooms().
+    No conflicts can arise by construction; returns None if a lecture of the chain is unavailable in its
+    new timeslot or if a timeslot has not enough rooms for the lectures moved into it
+    """
+    ts1 = position[1]
+    chain1, chain2 = kempeChain(position, ts2)
+    for room, ev in chain1:
+        if not hard.teacherIsAvailable(ev, ts2):
+            return None
+    for room, ev in chain2:
+        if not hard.teacherIsAvailable(ev, ts1):
+            return None
+
+    rooms1 = data.freeRooms[ts1] | {room for room, ev in chain1}
+    rooms2 = data.freeRooms[ts2] | {room for room, ev in chain2}
+    if len(chain1) > len(rooms2) or len(chain2) > len(rooms1):
+        return None
+
+    changes = [(ev.index, (old, ts1), (new, ts2)) for ev, old, new in assignRooms(chain1, rooms2)]
+    changes += [(ev.index, (old, ts2), (new, ts1)) for ev, old, new in assignRooms(chain2, rooms1)]
+    return changes
+
+
+def applyKempe(changes):
+    """
+    applies the changes of a Kempe chain swap to the timetable;
+    the lectures are removed and assigned again, so the move can be rolled back by hard.rollbackMove()
+    """
+    for c, old_pos, new_pos in changes:
+        hard.removeCourseAtPosition(old_pos)
+    for c, old_pos, new_pos in changes:
+        hard.assignCourseToPosition(data.courseEvents[c], new_pos)
+
+
+def randomMove():
+    """
+    returns a randomly chosen move of the soft search, which is not applied:
+    ("timeslots", ts1, ts2), ("positions", pos1, pos2), ("rooms", r1, r2, timeslot)
+    or ("kempe", position, ts2); no Kempe chain swap is chosen if the timetable is empty
+    """
+    while True:
+        x = random.randrange(4)
+        if x == 0:
+            return ("timeslots",) + randomChose2timeslots()
+        elif x == 1:
+            return ("positions",) + randomChose2positions()
+        elif x == 2:
+            return ("rooms",) + randomChose2rooms() + (random.randrange(data.numberOfTimeslots),)
+        else:
+            position = randomLecture()
+            if position is None:
+                continue
+            ts2 = random.randrange(data.numberOfTimeslots - 1)
+            return "kempe", position, ts2 + (ts2 >= position[1])
+
+
+def feasibleChanges(move):
+    """
+    returns the changes of the move (see soft.deltaCost()) if the move changes the timetable and preserves
+    feasibility (the same moves swap2timeslots, swap2eventPositions, swap2eventRooms and kempeChanges accept),
+    otherwise None; the timetable is not changed
+    """
+    if move[0] == "kempe":
+        return kempeChanges(move[1], move[2])
+
+    if move[0] == "timeslots":
+        ts1, ts2 = move[1:]
+        events1 = [data.getEvent((room, ts1)) for room in range(data.numberOfRooms)]
+        events2 = [data.getEvent((room, ts2)) for room in range(data.numberOfRooms)]
+        for ev1, ev2 in zip(events1, events2):
+            if not hard.teacherIsAvailable(ev1, ts2) or not hard.teacherIsAvailable(ev2, ts1):
+                return None
+        return soft.changesSwapTimeslots(events1, events2, ts1, ts2)
+
+    if move[0] == "positions":
+        pos1, pos2 = move[1:]
+    else:
+        r1, r2, ts = move[1:]
+        pos1, pos2 = (r1, ts), (r2, ts)
+    event1 = data.getEvent(pos1)
+    event2 = data.getEvent(pos2)
+    if (event1 is None and event2 is None) or event1 == event2:
+        return None
+    if move[0] == "positions":
+        if event1 is not None and not hard.courseFitsIntoTimeslotReplacing(event1, pos2[1], event2):
+            return None
+        if event2 is not None and not hard.courseFitsIntoTimeslotReplacing(event2, pos1[1], event1):
+            return None
+    return soft.changesSwapPositions((pos1, event1), (pos2, event2))
+
+
+def applyMove(move, changes):
+    """
+    applies a feasible move with its changes (see feasibleChanges()) to the timetable,
+    the cost state is not updated
+    """
+    if move[0] == "kempe":
+        applyKempe(changes)
+        return
+    if move[0] == "timeslots":
+        swap2timeslots(move[1], move[2])
+        return
+    if move[0] == "positions":
+        pos1, pos2 = move[1:]
+    else:
+        r1, r2, ts = move[1:]
+        pos1, pos2 = (r1, ts), (r2, ts)
+    event1 = data.getEvent(pos1)
+    hard.setPosition(pos1, data.getEvent(pos2))
+    hard.setPosition(pos2, event1)
+
+
 def reverseSwapTimeslots(events_in_ts1, events_in_ts2, ts1, ts2):
     """
     reverse the swap of 2 timeslots
@@ -214,10 +396,12 @@ def reverseSwapTimeslots(events_in_ts1, events_in_ts2, ts1, ts2):
     """
 
     for i, ev in enumerate(events_in_ts1):
-        data.timetable[(i, ts1)] = ev
+        data.setEvent((i, ts1), ev)
 
     for i, ev in enumerate(events_in_ts2):
-        data.timetable[(i, ts2)] = ev
+        data.setEvent((i, ts2), ev)
+
+    hard.swapTimeslotCounters(ts1, ts2)
 
 
 def reverseSwapRooms(room_event1, room_event2, timeslot):
@@ -230,8 +414,8 @@ def reverseSwapRooms(room_event1, room_event2, timeslot):
     r1, event1 = room_event1
     r2, event2 = room_event2
 
-    data.timetable[(r1, timeslot)] = event1
-    data.timetable[(r2, timeslot)] = event2
+    hard.setPosition((r1, timeslot), event1)
+    hard.setPosition((r2, timeslot), event2)
 
 
 def reverseSwapPositions(pos_event1, pos_event2):
@@ -244,5 +428,5 @@ def reverseSwapPositions(pos_event1, pos_event2):
     pos1, event1 = pos_event1
     pos2, event2 = pos_event2
 
-    data.timetable[pos1] = event1
-    data.timetable[pos2] = event2
\ No newline at end of file
+    hard.setPosition(pos1, event1)
+    hard.setPosition(pos2, event2)
\ No newline at end of file
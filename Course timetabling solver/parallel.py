@@ -0,0 +1,272 @@
+""" Curriculum-based course timetabling solver;
+    solves timetabling problems formulated in .ectt file format (http://tabu.diegm.uniud.it/ctt/)
+    Copyright (C) 2013  Stephan E. Becker
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+__author__ = 'Stephan Becker'
+
+
+import os
+import time
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import initialisation
+import data
+import hard
+import improve
+import solver
+import validator
+
+
+# the solver of a worker process, created once per process by initialiseWorker()
+worker_solver = None
+
+
+def initialiseWorker(instance):
+    """
+    runs once in every worker process; the instance is parsed only once in the main process
+    and handed to each worker, its matrices are attached from shared memory
+    """
+    global worker_solver
+    worker_solver = solver.Solver(data.attachInstance(instance))
+
+
+def solveInWorker(time_limit, seed):
+    """
+    one independent run of construction, feasibility search and improvement in a worker process
+
+    returns the Result, without the instance to keep it small
+    """
+    result = worker_solver.solve(time_limit, seed)
+    result.worker = os.getpid()
+    result.instance = None
+    return result
+
+
+def validateResult(result):
+    """
+    recomputes the hard violations and the cost of the best timetable of a run in another process with the
+    validator (the instance must be the current one, see data.useInstance()); result.violations and
+    result.totalCost are set, result.valid is True if they agree with the distance and cost the run reported
+    """
+    report, result.violations, result.totalCost = validator.validate(result.best_tt)
+    result.valid = result.violations == result.best_distance and result.totalCost == result.best_cost
+    return result.valid
+
+
+def bestValidResult(instance, results):
+    """
+    validates the results of the runs on the instance, see validateResult()
+
+    returns the best result whose timetable agrees with what its run reported
+    """
+    data.useInstance(instance)
+    best = None
+    for result in results:
+        result.instance = instance
+        if validateResult(result) and (best is None or isBetter(result, best)):
+            best = result
+    if best is None:
+        raise RuntimeError("no run returned a timetable which agrees with its reported distance and cost")
+    return best
+
+
+def isBetter(result1, result2):
+    """
+    returns True if result1 is better than result2: smaller distance to feasibility first, then lower cost
+    """
+    return (result1.best_distance, result1.best_cost) < (result2.best_distance, result2.best_cost)
+
+
+def solveParallel(instance, workers=None, time_limit=None, seeds=None):
+    """
+    multi-start: runs independent pipelines with different seeds in a pool of worker processes;
+    the default is one run per worker, so all runs finish within the time limit
+
+    instance may be an Instance or the path of an .ectt file
+    returns the best validated Result (see bestValidResult()) and the Results of all runs ordered by seed
+    """
+    if isinstance(instance, str):
+        instance = data.loadInstance(instance)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if time_limit is None:
+        time_limit = initialisation.max_runtime
+    if seeds is None:
+        seeds = range(workers)
+
+    block, shared = data.shareInstance(instance)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=initialiseWorker, initargs=(shared,)) as pool:
+            futures = [pool.submit(solveInWorker, time_limit, seed) for seed in seeds]
+            results = [future.result() for future in futures]
+    finally:
+        block.close()
+        block.unlink()
+
+    return bestValidResult(instance, results), results
+
+
+def runIsland(instance, time_limit, seed, migration_interval, connection):
+    """
+    an island of the island model, runs in its own process:
+    construction and search for feasibility, then a tabu search which reports its best timetable
+    to the coordinator every migration_interval seconds and continues from a migrant if it receives one;
+    timetables are sent as the bytes of their course index arrays
+
+    sends the final Result to the coordinator
+    """
+    island_solver = solver.Solver(data.attachInstance(instance))
+    result = island_solver.prepare(time_limit, seed)
+    result.migrations = 0
+    starting_time = time.perf_counter()
+    improve.initialise()
+    # the tabu lists are kept from one interval to the next, they are only renewed with a migrant
+    tabu_lists = improve.newTabuLists(initialisation.tabu_length)
+
+    while True:
+        # run the tabu search until the end of the interval
+        data.max_runtime = min(time_limit, time.perf_counter() - data.starting_time + migration_interval)
+        improve.tabu_search_soft(initialisation.tabu_length, tabu_lists)
+        if improve.best_cost == 0 or time.perf_counter() - data.starting_time >= time_limit:
+            break
+
+        connection.send((improve.best_cost, improve.best_feasible_tt.tobytes()))
+        migrant = connection.recv()
+        if migrant is not None:
+            tt = array('h')
+            tt.frombytes(migrant)
+            hard.restoreSnapshot(tt)
+            result.moves += improve.moves_tried
+            improve.initialise()
+            tabu_lists = improve.newTabuLists(initialisation.tabu_length)
+            result.migrations += 1
+
+    result.improvement_time = time.perf_counter() - starting_time
+    result.best_cost = improve.best_cost
+    result.best_tt = improve.best_feasible_tt
+    result.time_to_best = improve.best_time
+    result.moves += improve.moves_tried
+    result.worker = os.getpid()
+    island_solver.finish(result)
+    result.instance = None
+    connection.send(result)
+    connection.close()
+
+
+def solveIslands(instance, islands=None, time_limit=None, migration_interval=None, seeds=None):
+    """
+    island model: one tabu search per island process, all islands report their best timetable
+    every migration_interval seconds (default: initialisation.migration_interval);
+    an island which has not improved since its last report continues from the best timetable
+    found by any island so far (the elite), if that one is better than its own
+
+    instance may be an Instance or the path of an .ectt file
+    returns the best validated Result (see bestValidResult()) and the Results of all islands ordered by seed;
+    an island which fails has no Result
+    """
+    if isinstance(instance, str):
+        instance = data.loadInstance(instance)
+    if islands is None:
+        islands = os.cpu_count() or 1
+    if time_limit is None:
+        time_limit = initialisation.max_runtime
+    if migration_interval is None:
+        migration_interval = initialisation.migration_interval
+    if seeds is None:
+        seeds = range(islands)
+    seeds = list(seeds)
+
+    connections = []
+    processes = []
+    results = [None] * len(seeds)
+    block, shared = data.shareInstance(instance)
+    try:
+        for seed in seeds:
+            connection, island_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=runIsland,
+                                              args=(shared, time_limit, seed, migration_interval, island_connection))
+            process.start()
+            # only the island holds its end, so recv() raises EOFError once the island has ended
+            island_connection.close()
+            connections.append(connection)
+            processes.append(process)
+
+        last_cost = [None] * len(seeds)
+        elite_cost = None
+        elite_tt = None
+        active = list(range(len(seeds)))
+
+        while active:
+            # collect the reports of all active islands; an island which failed is finished without a Result
+            reports = {}
+            finished = set()
+            for i in active:
+                try:
+                    message = connections[i].recv()
+                except EOFError:
+                    finished.add(i)
+                    continue
+                if isinstance(message, solver.Result):
+                    results[i] = message
+                    finished.add(i)
+                else:
+                    reports[i] = message
+                    if elite_cost is None or message[0] < elite_cost:
+                        elite_cost, elite_tt = message
+            active = [i for i in active if i not in finished]
+
+            # replace the stagnating islands with the elite
+            for i, (cost, tt) in reports.items():
+                stagnating = last_cost[i] is not None and cost >= last_cost[i]
+                last_cost[i] = cost
+                try:
+                    if stagnating and elite_cost < cost:
+                        connections[i].send(elite_tt)
+                    else:
+                        connections[i].send(None)
+                except (BrokenPipeError, EOFError):
+                    active.remove(i)
+    finally:
+        # the islands end after sending their Result; the ones still running after an error are terminated
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for connection in connections:
+            connection.close()
+        block.close()
+        block.unlink()
+
+    results = [result for result in results if result is not None]
+    if not results:
+        raise RuntimeError("all islands failed")
+
+    return bestValidResult(instance, results), results
+
+
+def printStatistics(results):
+    """
+    print one line of statistics for every run
+    """
+    print("seed".rjust(6), "worker".rjust(8), "distance".rjust(9), "cost".rjust(7), "construction".rjust(13),
+          "feasibility".rjust(12), "improvement".rjust(12))
+    for result in results:
+        print(str(result.seed).rjust(6), str(result.worker).rjust(8), str(result.best_distance).rjust(9),
+              str(result.best_cost).rjust(7), "{:.2f}".format(result.construction_time).rjust(13),
+              "{:.2f}".format(result.feasibility_time).rjust(12), "{:.2f}".format(result.improvement_time).rjust(12))
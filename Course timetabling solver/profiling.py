@@ -0,0 +1,252 @@
+""" Curriculum-based course timetabling solver;
+    solves timetabling problems formulated in .ectt file format (http://tabu.diegm.uniud.it/ctt/)
+    Copyright (C) 2013  Stephan E. Becker
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+__author__ = 'Stephan Becker'
+
+import os
+import sys
+import time
+import threading
+import cProfile
+import collections
+import functools
+
+import data
+import hard
+import soft
+import neighborhood
+
+# opt-in instrumentation of a run (initialisation.instrumentation, initialisation.profiler):
+# counters of the outcomes of the neighborhood moves and timers of the hot paths per phase of the solver
+# and a cProfile or sampling profile written to a file.
+# the timers replace the timed functions in their modules by wrappers while instrumentation is enabled,
+# so a run without instrumentation is not slowed down; the timings include the overhead of the wrappers
+
+profiles_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+# functions timed per category: (module, function name)
+timed_functions = {"cost evaluation": [(soft, "deltaCost"), (soft, "deltaCosts"), (soft, "totalCostTimetable")],
+                   "hard checks": [(hard, "teacherIsAvailable"), (hard, "courseFitsIntoTimeslot"),
+                                   (hard, "courseFitsIntoTimeslotReplacing"), (hard, "countViolations"),
+                                   (neighborhood, "feasibleChanges")],
+                   "snapshots": [(data, "takeSnapshot"), (hard, "restoreSnapshot")]}
+
+# outcomes of a neighborhood move; a move is attempted and then either rejected as infeasible,
+# rejected as tabu, rejected because of its cost or accepted. improving counts the accepted moves which lower the cost;
+# the rejected moves are not counted but derived by statistics()
+outcomes = ("attempted", "infeasible", "tabu", "rejected", "accepted", "improving")
+
+enabled = False
+phase = None
+
+# (phase, neighborhood) -> outcome -> count
+counters = {}
+# (phase, category) -> [calls, seconds]
+timers = {}
+# categories whose timer is running; calls nested in a call of the same category are not timed twice
+running = set()
+
+originals = {}
+
+profiler = None
+
+
+def timed(category, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if category in running:
+            return fn(*args, **kwargs)
+        running.add(category)
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timer = timers.setdefault((phase, category), [0, 0.])
+            timer[0] += 1
+            timer[1] += time.perf_counter() - t0
+            running.discard(category)
+    return wrapper
+
+
+def reset():
+    global phase
+    phase = None
+    counters.clear()
+    timers.clear()
+    running.clear()
+
+
+def enable():
+    """
+    starts counting and timing; the counters and timers are reset
+    """
+    global enabled
+    reset()
+    if not enabled:
+        for category, functions in timed_functions.items():
+            for module, name in functions:
+                originals[(module, name)] = getattr(module, name)
+                setattr(module, name, timed(category, originals[(module, name)]))
+    enabled = True
+
+
+def disable():
+    """
+    stops counting and timing; the counters and timers are kept until the next enable()
+    """
+    global enabled
+    for (module, name), fn in originals.items():
+        setattr(module, name, fn)
+    originals.clear()
+    enabled = False
+
+
+def setPhase(name):
+    """
+    the following timings belong to the phase name (construction, feasibility, improvement)
+    """
+    global phase
+    phase = name
+
+
+def countMove(move_type, outcome):
+    """
+    counts an outcome of a move of the neighborhood move_type in the current phase;
+    only called while instrumentation is enabled
+    """
+    counts = counters.get((phase, move_type))
+    if counts is None:
+        counts = counters[(phase, move_type)] = dict.fromkeys(outcomes, 0)
+    counts[outcome] += 1
+
+
+def countAccepted(move_type, delta):
+    """
+    counts an accepted move of the neighborhood move_type which changes the cost by delta
+    """
+    countMove(move_type, "accepted")
+    if delta < 0:
+        countMove(move_type, "improving")
+
+
+def statistics():
+    """
+    returns the counters per phase and neighborhood and the timers per phase and category as a dict
+    which can be pickled and written as JSON
+    """
+    phases = {}
+    for (phase_name, category), (calls, seconds) in timers.items():
+        phases.setdefault(str(phase_name), {})[category] = {"calls": calls, "seconds": seconds}
+    moves = {}
+    for (phase_name, move_type), counts in counters.items():
+        move_counts = moves.setdefault(str(phase_name), {})[move_type] = dict(counts)
+        move_counts["rejected"] = counts["attempted"] - counts["infeasible"] - counts["tabu"] - counts["accepted"]
+    return {"moves": moves, "timers": phases}
+
+
+def report(stats):
+    """
+    returns the statistics of a run (see statistics()) as a list of lines
+    """
+    lines = ["{:<14}{:<12}".format("phase", "moves") + "".join("{:>12}".format(outcome) for outcome in outcomes)]
+    for phase_name, move_types in stats["moves"].items():
+        for move_type, counts in sorted(move_types.items()):
+            lines.append("{:<14}{:<12}".format(phase_name, move_type) +
+                         "".join("{:>12}".format(counts[outcome]) for outcome in outcomes))
+    lines.append("")
+    lines.append("{:<14}{:<18}{:>12}{:>12}{:>14}".format("phase", "timer", "calls", "seconds", "us per call"))
+    for phase_name, categories in stats["timers"].items():
+        for category, timer in sorted(categories.items()):
+            lines.append("{:<14}{:<18}{:>12}{:>12.3f}{:>14.2f}".format(
+                phase_name, category, timer["calls"], timer["seconds"], 1e6 * timer["seconds"] / timer["calls"]))
+    return lines
+
+
+class SamplingProfiler:
+    """
+    samples the stack of a thread (default: the calling thread) every interval seconds in a background thread;
+    the samples are written in the collapsed stack format of flame graph tools, one "f1;f2;f3 count" per line
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.samples = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("{}:{}".format(os.path.basename(code.co_filename)[:-3], code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def dump_stats(self, filename):
+        with open(filename, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write("{} {}\n".format(stack, count))
+
+
+def startProfiler(kind):
+    """
+    starts a profiler of the kind "cProfile" or "sampling"
+    """
+    global profiler
+    if kind == "cProfile":
+        profiler = cProfile.Profile()
+    elif kind == "sampling":
+        profiler = SamplingProfiler()
+    else:
+        raise ValueError("unknown profiler: " + str(kind))
+    profiler.enable()
+
+
+def cancelProfiler():
+    """
+    stops the profiler without writing its results
+    """
+    global profiler
+    profiler.disable()
+    profiler = None
+
+
+def stopProfiler(name):
+    """
+    stops the profiler and writes its results to the folder profiles:
+    name.prof for cProfile (read with pstats or snakeviz), name.txt for the sampling profiler
+
+    returns the filename
+    """
+    global profiler
+    profiler.disable()
+    os.makedirs(profiles_dir, exist_ok=True)
+    filename = os.path.join(profiles_dir, name + (".prof" if isinstance(profiler, cProfile.Profile) else ".txt"))
+    profiler.dump_stats(filename)
+    profiler = None
+    return filename
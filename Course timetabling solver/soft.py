@@ -44,7 +44,7 @@ def roomCapacityTimeslot(event, timeslot):
     """
     penalty = 0
     for r in range(data.numberOfRooms):
-        ev = data.timetable[(r, timeslot)]
+        ev = data.getEvent((r, timeslot))
         if ev is not None and ev.id == event.id:
             penalty += roomCapacity(event, r)
 
@@ -59,8 +59,7 @@ def roomCapacityAll():
     returns the total penalty for all events in the timetable
     """
     mapping = {}
-    for pos in data.timetable.keys():
-        ev = data.timetable[pos]
+    for pos, ev in data.timetableItems():
         if ev is not None:
             try:
                 mapping[ev.id] += roomCapacity(ev, pos[0])
@@ -151,7 +150,7 @@ def roomStability(event):
     """
     penalty = 0
     used_rooms = []
-    for pos, ev in data.timetable.items():
+    for pos, ev in data.timetableItems():
         if ev is not None and ev.id == event.id:
             room = pos[0]
             if room not in used_rooms:
@@ -164,20 +163,266 @@ def roomStability(event):
     return penalty * data.RoomStability
 
 
-def totalCostTimetable():
+def totalCostTimetable(tt=None):
     """
-    returns the total cost of the timetable
+    returns the total cost of the timetable tt (default: the current timetable);
+    evaluates all constraints at once on the bitsets of the timetable (see data.timetableBitsets()):
+    working days and distinct rooms are bit counts, isolated lectures of a curriculum are the timeslots
+    of its bitset without a set bit in the bitset shifted by one timeslot to either side within the day
     """
-    total_cost = roomCapacityAll()
-    for course in data.courses:
-        total_cost += minWorkingDays(course)
-        total_cost += roomStability(course)
-    for cu in data.curricula:
-        total_cost += isolatedLectures(cu)
+    if tt is None:
+        tt = data.timetable
+    timeslotMasks, roomMasks = data.timetableBitsets(tt)
+
+    T = data.numberOfTimeslots
+    R = data.numberOfRooms
+    excess = data.roomCapacityExcess
+    total_cost = 0
+    for i, c in enumerate(tt):
+        if c >= 0:
+            total_cost += excess[c * R + i // T]
+
+    for c, course in enumerate(data.courses):
+        mask = timeslotMasks[c]
+        working_days = 0
+        for dayMask in data.dayMasks:
+            if mask & dayMask:
+                working_days += 1
+        total_cost += max(course.minWorkingDays - working_days, 0) * data.MinWorkingDays
+        if mask:
+            total_cost += (roomMasks[c].bit_count() - 1) * data.RoomStability
+
+    curriculumMasks = [0] * len(data.curricula)
+    for c, mask in enumerate(timeslotMasks):
+        for cu in data.courseIndexToCurricula[c]:
+            curriculumMasks[cu] |= mask
+    for mask in curriculumMasks:
+        adjacent = ((mask << 1) & ~data.firstPeriodMask) | ((mask >> 1) & ~data.lastPeriodMask)
+        total_cost += (mask & ~adjacent).bit_count() * data.IsolatedLectures
 
     return total_cost
 
 
+# incremental cost state of the current timetable, built by initialiseCostState();
+# allows the cost change of a move to be computed without rescanning the whole timetable
+courseDayCount = []             # [course][day] number of lectures of the course on the day
+courseWorkingDays = []          # [course] number of days with at least one lecture of the course
+courseRoomCount = []            # [course][room] number of lectures of the course in the room
+courseRoomsUsed = []            # [course] number of distinct rooms used by the course
+curriculumTimeslotCount = []    # [curriculum][timeslot] number of lectures of the curriculum in the timeslot
+
+
+def initialiseCostState():
+    """
+    builds the incremental cost state from the current timetable
+    """
+    global courseDayCount, courseWorkingDays, courseRoomCount, courseRoomsUsed, curriculumTimeslotCount
+    courseDayCount = [[0] * data.header.days for c in data.courses]
+    courseWorkingDays = [0] * len(data.courses)
+    courseRoomCount = [[0] * data.numberOfRooms for c in data.courses]
+    courseRoomsUsed = [0] * len(data.courses)
+    curriculumTimeslotCount = [[0] * data.numberOfTimeslots for cu in data.curricula]
+
+    for pos, ev in data.timetableItems():
+        if ev is not None:
+            addLectureToCostState(ev.index, pos)
+
+
+def addLectureToCostState(c, position):
+    """
+    registers a lecture of the course with index c at the position
+    """
+    room, ts = position
+    day = ts // data.header.periods
+    courseDayCount[c][day] += 1
+    if courseDayCount[c][day] == 1:
+        courseWorkingDays[c] += 1
+    courseRoomCount[c][room] += 1
+    if courseRoomCount[c][room] == 1:
+        courseRoomsUsed[c] += 1
+    for cu in data.courseIndexToCurricula[c]:
+        curriculumTimeslotCount[cu][ts] += 1
+
+
+def removeLectureFromCostState(c, position):
+    """
+    unregisters a lecture of the course with index c at the position
+    """
+    room, ts = position
+    day = ts // data.header.periods
+    courseDayCount[c][day] -= 1
+    if courseDayCount[c][day] == 0:
+        courseWorkingDays[c] -= 1
+    courseRoomCount[c][room] -= 1
+    if courseRoomCount[c][room] == 0:
+        courseRoomsUsed[c] -= 1
+    for cu in data.courseIndexToCurricula[c]:
+        curriculumTimeslotCount[cu][ts] -= 1
+
+
+def isolatedLecturesOfDay(cu, day):
+    """
+    returns the number of isolated lectures of the curriculum with index cu on the day
+    """
+    count = curriculumTimeslotCount[cu]
+    first = day * data.header.periods
+    last = first + data.header.periods - 1
+    isolated = 0
+    for ts in range(first, last + 1):
+        if count[ts] > 0:
+            if not ((ts > first and count[ts - 1] > 0) or (ts < last and count[ts + 1] > 0)):
+                isolated += 1
+    return isolated
+
+
+def localCost(affected_courses, affected_curriculum_days):
+    """
+    returns the minWorkingDays, roomStability and isolatedLectures penalties
+    of the given courses and (curriculum, day) pairs according to the cost state
+    """
+    cost = 0
+    for c in affected_courses:
+        cost += courseCost(c)
+    for cu, day in affected_curriculum_days:
+        cost += isolatedLecturesOfDay(cu, day) * data.IsolatedLectures
+    return cost
+
+
+def courseCost(c):
+    """
+    returns the minWorkingDays and roomStability penalties of the course with index c according to the cost state
+    """
+    return max(data.courses[c].minWorkingDays - courseWorkingDays[c], 0) * data.MinWorkingDays + \
+        max(courseRoomsUsed[c] - 1, 0) * data.RoomStability
+
+
+def deltaCost(changes):
+    """
+    returns the cost change of a move without applying it to the cost state;
+    a move is a list of changes (course index, old position, new position)
+    """
+    affected_courses = set()
+    affected_curriculum_days = set()
+    delta = 0
+    for c, old_pos, new_pos in changes:
+        affected_courses.add(c)
+        for cu in data.courseIndexToCurricula[c]:
+            affected_curriculum_days.add((cu, old_pos[1] // data.header.periods))
+            affected_curriculum_days.add((cu, new_pos[1] // data.header.periods))
+        delta += roomCapacity(data.courses[c], new_pos[0]) - roomCapacity(data.courses[c], old_pos[0])
+
+    delta -= localCost(affected_courses, affected_curriculum_days)
+    applyChanges(changes)
+    delta += localCost(affected_courses, affected_curriculum_days)
+    reverseChanges(changes)
+    return delta
+
+
+def deltaCosts(moves):
+    """
+    returns the cost changes of many moves, given as lists of changes, see deltaCost();
+    all moves start from the same cost state, so the penalties of a course or a (curriculum, day) pair
+    before the moves are computed once for the whole batch and only the penalties after each move are evaluated.
+    the cost state is unchanged afterwards
+    """
+    R = data.numberOfRooms
+    periods = data.header.periods
+    excess = data.roomCapacityExcess
+    courseIndexToCurricula = data.courseIndexToCurricula
+    # penalties before the moves: course -> cost, (curriculum, day) -> isolated lectures
+    course_before = {}
+    day_before = {}
+    deltas = []
+    for changes in moves:
+        affected_courses = set()
+        affected_curriculum_days = set()
+        delta = 0
+        for c, old_pos, new_pos in changes:
+            affected_courses.add(c)
+            for cu in courseIndexToCurricula[c]:
+                affected_curriculum_days.add((cu, old_pos[1] // periods))
+                affected_curriculum_days.add((cu, new_pos[1] // periods))
+            delta += excess[c * R + new_pos[0]] - excess[c * R + old_pos[0]]
+
+        for c in affected_courses:
+            before = course_before.get(c)
+            if before is None:
+                before = course_before[c] = courseCost(c)
+            delta -= before
+        isolated = 0
+        for key in affected_curriculum_days:
+            before = day_before.get(key)
+            if before is None:
+                before = day_before[key] = isolatedLecturesOfDay(*key)
+            isolated -= before
+
+        applyChanges(changes)
+        delta += localCost(affected_courses, affected_curriculum_days) + isolated * data.IsolatedLectures
+        reverseChanges(changes)
+        deltas.append(delta)
+    return deltas
+
+
+def applyChanges(changes):
+    """
+    updates the cost state after a move has been accepted
+    """
+    for c, old_pos, new_pos in changes:
+        removeLectureFromCostState(c, old_pos)
+    for c, old_pos, new_pos in changes:
+        addLectureToCostState(c, new_pos)
+
+
+def reverseChanges(changes):
+    """
+    restores the cost state of before the move
+    """
+    for c, old_pos, new_pos in changes:
+        removeLectureFromCostState(c, new_pos)
+    for c, old_pos, new_pos in changes:
+        addLectureToCostState(c, old_pos)
+
+
+def changesSwapTimeslots(events_in_ts1, events_in_ts2, ts1, ts2):
+    """
+    returns the changes of a swap of 2 timeslots,
+    given the events originally assigned to both timeslots
+    """
+    changes = []
+    for room, ev in enumerate(events_in_ts1):
+        if ev is not None:
+            changes.append((ev.index, (room, ts1), (room, ts2)))
+    for room, ev in enumerate(events_in_ts2):
+        if ev is not None:
+            changes.append((ev.index, (room, ts2), (room, ts1)))
+    return changes
+
+
+def changesSwapPositions(pos_event1, pos_event2):
+    """
+    returns the changes of a swap of 2 events,
+    given 2 tuples of (original position, event)
+    """
+    pos1, event1 = pos_event1
+    pos2, event2 = pos_event2
+    changes = []
+    if event1 is not None:
+        changes.append((event1.index, pos1, pos2))
+    if event2 is not None:
+        changes.append((event2.index, pos2, pos1))
+    return changes
+
+
+def changesSwapRooms(room_event1, room_event2, timeslot):
+    """
+    returns the changes of a swap of 2 rooms within a timeslot,
+    given 2 tuples of (original room, event)
+    """
+    r1, event1 = room_event1
+    r2, event2 = room_event2
+    return changesSwapPositions(((r1, timeslot), event1), ((r2, timeslot), event2))
+
+
 
     # tc=totalCostTimetable()
     # print("total cost: "+str(tc))
\ No newline at end of file
@@ -0,0 +1,181 @@
+""" Curriculum-based course timetabling solver;
+    solves timetabling problems formulated in .ectt file format (http://tabu.diegm.uniud.it/ctt/)
+    Copyright (C) 2013  Stephan E. Becker
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+__author__ = 'Stephan Becker'
+
+
+import random
+import time
+
+import initialisation
+import misc
+import data
+import hard
+import construct
+import feasibility
+import improve
+import profiling
+import convergence
+
+
+class InfeasibleTimetableError(Exception):
+    """
+    the timetable of a run violates hard constraints besides unassigned lectures,
+    which the construction and the search for feasibility must never produce
+    """
+
+
+class Result:
+    """
+    the outcome of a single run of the solver
+    """
+
+    def __init__(self, instance, seed):
+        self.instance = instance
+        self.name = instance.header.name
+        self.input_file_choice = instance.input_file_choice
+        self.seed = seed
+
+        self.construction_time = 0
+        self.distanceToFeasibility = 0  # distance after construction
+        self.feasibility_time = 0
+        self.best_distance = 0          # distance after the search for feasibility
+        self.improvement_time = 0
+        self.best_cost = 0              # soft cost of the best timetable
+        self.best_tt = None             # snapshot of the best timetable, see data.takeSnapshot()
+        self.time_to_best = 0           # seconds from the start of the run until the best timetable was found
+        self.moves = 0                  # number of neighborhood moves tried by the improvement
+        self.statistics = None          # move counters and timers if initialisation.instrumentation is set
+        self.profile_file = None        # written if initialisation.profiler is set
+        self.trace_file = None          # convergence trace, written if initialisation.trace is set
+
+        # set by validate.saveSolution()
+        self.outputList = []
+        self.violations = None
+        self.totalCost = None
+        # set by parallel.validateResult(): whether the validator agrees with best_distance and best_cost
+        self.valid = None
+
+    def __repr__(self):
+        return "<Result: {}, seed: {}, distance: {}, cost: {}>".format(self.name, self.seed, self.best_distance,
+                                                                       self.best_cost)
+
+
+class Solver:
+    """
+    solves an instance: construction, search for feasibility and improvement.
+    the instance is parsed once; every call of solve() is an independent run starting from an empty timetable.
+    the timetable of a run is kept in the module data, so a process runs one solve() at a time
+    """
+
+    def __init__(self, instance):
+        if isinstance(instance, str):
+            instance = data.loadInstance(instance)
+        self.instance = instance
+
+    def prepare(self, time_limit=None, seed=None):
+        """
+        starts a run of at most time_limit seconds (default: initialisation.max_runtime):
+        construction and search for feasibility; the best timetable found becomes the current timetable.
+        seed initialises the random number generator if it is given
+
+        returns the Result so far
+        """
+        if time_limit is None:
+            time_limit = initialisation.max_runtime
+        if seed is not None:
+            random.seed(seed)
+
+        data.useInstance(self.instance)
+        data.starting_time = time.perf_counter()
+        data.max_runtime = time_limit
+        if initialisation.trace:
+            convergence.start("{}-{}".format(self.instance.header.name, seed),
+                              {"instance": self.instance.header.name, "seed": seed, "time_limit": time_limit,
+                               "searchType": initialisation.searchType, "improveType": initialisation.improveType},
+                              initialisation.trace_interval)
+        if initialisation.instrumentation:
+            profiling.enable()
+        if initialisation.profiler:
+            profiling.startProfiler(initialisation.profiler)
+
+        try:
+            result = Result(self.instance, seed)
+            profiling.setPhase("construction")
+            result.construction_time, result.distanceToFeasibility = misc.timedcall(construct.constructTimetable)
+            profiling.setPhase("feasibility")
+            result.feasibility_time, result.best_distance = feasibility.reachFeasibility(result.distanceToFeasibility)
+            # the distance counts the unassigned lectures, the timetable must not violate any other hard constraint
+            if hard.countViolations() != result.best_distance:
+                raise InfeasibleTimetableError("the timetable violates hard constraints besides unassigned lectures")
+        except BaseException:
+            self.abort()
+            raise
+        profiling.setPhase("improvement")
+        return result
+
+    def solve(self, time_limit=None, seed=None):
+        """
+        runs the solver on the instance for at most time_limit seconds (default: initialisation.max_runtime);
+        seed initialises the random number generator if it is given
+
+        returns a Result
+        """
+        result = self.prepare(time_limit, seed)
+        try:
+            result.improvement_time, result.best_cost, result.best_tt = improve.improveTimetable()
+        except BaseException:
+            self.abort()
+            raise
+        result.time_to_best = improve.best_time
+        result.moves = improve.moves_tried
+        self.finish(result)
+        return result
+
+    def finish(self, result):
+        """
+        ends the instrumentation of a run: stores the statistics, writes the profile and the last record of the trace
+        """
+        if convergence.enabled:
+            convergence.record("end", None, result.best_cost, result.best_cost)
+            result.trace_file = convergence.stop()
+        if profiling.profiler is not None:
+            result.profile_file = profiling.stopProfiler("{}-{}".format(result.name, result.seed))
+        if profiling.enabled:
+            result.statistics = profiling.statistics()
+            profiling.disable()
+
+    def abort(self):
+        """
+        ends the instrumentation of a run which has failed, so later runs of the process are not instrumented:
+        the timed functions are restored, the profiler is stopped without writing its results and the trace is closed
+        """
+        if convergence.enabled:
+            convergence.stop()
+        if profiling.profiler is not None:
+            profiling.cancelProfiler()
+        if profiling.enabled:
+            profiling.disable()
+
+
+def solve(instance_path, time_limit=None, seed=None):
+    """
+    parses the instance and runs the solver once on it
+
+    returns a Result
+    """
+    return Solver(instance_path).solve(time_limit, seed)
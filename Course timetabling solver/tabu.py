@@ -0,0 +1,58 @@
+""" Curriculum-based course timetabling solver;
+    solves timetabling problems formulated in .ectt file format (http://tabu.diegm.uniud.it/ctt/)
+    Copyright (C) 2013  Stephan E. Becker
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+__author__ = 'Stephan Becker'
+
+
+import collections
+
+
+class TabuList:
+    """
+    tabu list of a fixed length; when a new move exceeds the tabu length, the oldest move is forgotten.
+    the moves are kept in a deque for the expiry and counted in a dict for the membership test,
+    so append, expiry and "move in T" take constant time regardless of the tabu length
+    """
+
+    def __init__(self, tabu_length):
+        self.tabu_length = tabu_length
+        self.moves = collections.deque()
+        self.count = {}
+
+    def append(self, move):
+        """
+        make the move tabu, forget the oldest move if the list is full
+        """
+        if self.tabu_length <= 0:
+            return
+        self.moves.append(move)
+        self.count[move] = self.count.get(move, 0) + 1
+        if len(self.moves) > self.tabu_length:
+            oldest = self.moves.popleft()
+            if self.count[oldest] == 1:
+                del self.count[oldest]
+            else:
+                self.count[oldest] -= 1
+
+    def __contains__(self, move):
+        return move in self.count
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __repr__(self):
+        return "<TabuList length: {}, moves: {}>".format(self.tabu_length, len(self.moves))
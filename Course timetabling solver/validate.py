@@ -17,47 +17,58 @@
 
 __author__ = 'Stephan Becker'
 
-import subprocess
 import os
 import datetime
 
 import initialisation
 import data
-
-import construct
-import feasibility
-import improve
+import validator
 
 formulation = "UD2"
 
-solutions_dir = os.path.join(os.path.dirname(__file__), 'solutions') + "\\"
+solver_dir = os.path.dirname(os.path.abspath(__file__))
+solutions_dir = os.path.join(solver_dir, 'solutions')
 
-output_file = data.header.name + "-last"
-filename_last = solutions_dir + output_file + "." + formulation
-filename_best = solutions_dir + data.header.name + "." + formulation
-filename_lastTxt = solutions_dir + output_file + formulation + ".txt"
-filename_bestTxt = solutions_dir + data.header.name + "-" + formulation + ".txt"
-filename_csv = solutions_dir + "all_runs-" + formulation + ".csv"
+filename_csv = os.path.join(solutions_dir, "all_runs-" + formulation + ".csv")
 
-firstRun = not os.path.exists(filename_best)
+# the files of the instance of the current result, see setFilenames()
+filename_last = None
+filename_best = None
+filename_lastTxt = None
+filename_bestTxt = None
 
-if firstRun:
-    outputFilename = filename_best
-else:
-    outputFilename = filename_last
+firstRun = True
+outputFilename = None
 
 
-def output_solution(tt_dict):
+def setFilenames(name):
     """
-    produces an output file
-    <CourseID> <RoomID> <Day> <Day_Period>
+    sets the names of the solution files of the instance;
+    the first solution of an instance is saved as the best one, any later one as the last one
     """
+    global filename_last, filename_best, filename_lastTxt, filename_bestTxt, firstRun, outputFilename
+    output_file = name + "-last"
+    filename_last = os.path.join(solutions_dir, output_file + "." + formulation)
+    filename_best = os.path.join(solutions_dir, name + "." + formulation)
+    filename_lastTxt = os.path.join(solutions_dir, output_file + formulation + ".txt")
+    filename_bestTxt = os.path.join(solutions_dir, name + "-" + formulation + ".txt")
+
+    firstRun = not os.path.exists(filename_best)
+
     if firstRun:
-        outputTTData = open(filename_best, "w")
+        outputFilename = filename_best
     else:
-        outputTTData = open(filename_last, "w")
+        outputFilename = filename_last
+
+
+def output_solution(tt):
+    """
+    produces an output file
+    <CourseID> <RoomID> <Day> <Day_Period>
+    """
+    outputTTData = open(outputFilename, "w")
 
-    for period, assignedCourse in tt_dict.items():
+    for period, assignedCourse in data.timetableItems(tt):
         if assignedCourse is not None:
             roomIndex, timeslot = period
             day, period = data.convertTimeslotToDayPeriod(timeslot)
@@ -67,34 +78,15 @@ def output_solution(tt_dict):
     outputTTData.close()
 
 
-def formatValidatorOutput(output):
+def validate_solution(tt):
     """
-    returns the output as a list AND returns the total cost
+    validates the timetable in-process like validator.exe does for the saved solution file
+    returns the validator output as a list, the number of violations and the total cost
     """
-    outputSplit = output.splitlines()
-    outputList = [line.decode("utf-8") for line in outputSplit]
-
-    lastLine = outputList[-1].replace(",", "")
-    numbers = [int(s) for s in lastLine.split() if s.isdigit()]
-    if len(numbers) == 1:
-        violations = 0
-        totalCost = numbers[0]
-    else:
-        violations = numbers[0]
-        totalCost = numbers[1]
-
-    return outputList, violations, totalCost
-
+    return validator.validate(tt, formulation)
 
-def validate_solution():
-    p = subprocess.Popen(["validator.exe",
-                          formulation, data.input_file, outputFilename], stdout=subprocess.PIPE)
-    out, err = p.communicate()
-    outputList, violations, totalCost = formatValidatorOutput(out)
-    return outputList, violations, totalCost
 
-
-def writeValidationToTxt():
+def writeValidationToTxt(result):
     """
     first line is total Cost
     rest is validator output
@@ -104,55 +96,45 @@ def writeValidationToTxt():
     else:
         outputTxt = open(filename_lastTxt, "w")
 
-    outputTxt.write(str(feasibility.best_distance) + "\n")
-    outputTxt.write(str(violations) + "\n")
-    outputTxt.write(str(totalCost) + "\n")
-    for line in outputList:
+    outputTxt.write(str(result.best_distance) + "\n")
+    outputTxt.write(str(result.violations) + "\n")
+    outputTxt.write(str(result.totalCost) + "\n")
+    for line in result.outputList:
         outputTxt.write(line + "\n")
-    outputTxt.write("Construction time in seconds: " + str(construct.construction_time) + "\n")
-    outputTxt.write("Reaching feasibility time in seconds: " + str(feasibility.feasibility_time) + "\n")
-    outputTxt.write("Improvement time in seconds: " + str(improve.improvement_time))
+    outputTxt.write("Construction time in seconds: " + str(result.construction_time) + "\n")
+    outputTxt.write("Reaching feasibility time in seconds: " + str(result.feasibility_time) + "\n")
+    outputTxt.write("Improvement time in seconds: " + str(result.improvement_time))
     outputTxt.close()
 
 
-def appendInfoToCSV():
+def appendInfoToCSV(result):
     """
     append the info for the current run to a csv file
     info includes:
     Date and Time, Instance name, runtime construction, distance after construction, runtime feasibility,
     distance after feasibility, runtime improvement, number of violations, total cost, search type, improve type,
-    neighborhood, distance over time, soft cost over time
+    the file of the convergence trace if one was written
     """
     now = datetime.datetime.today()
 
-    # padding for lists
-    while len(initialisation.distance_over_time) < 200:
-        initialisation.distance_over_time.append(0)
-    while len(initialisation.soft_score_over_time) < 200:
-        initialisation.soft_score_over_time.append(0)
-
-    info_string = "{},{},{},{},{},{},{},{},{},{},{},distance:,{},penalty:,{}\n".format(str(now), data.input_file_choice,
-                                                                                       construct.construction_time,
-                                                                                       construct.distanceToFeasibility,
-                                                                                       feasibility.feasibility_time,
-                                                                                       feasibility.best_distance,
-                                                                                       improve.improvement_time,
-                                                                                       violations, totalCost,
-                                                                                       initialisation.searchType,
-                                                                                       initialisation.improveType,
-                                                                                       initialisation.distance_over_time,
-                                                                                       initialisation.soft_score_over_time)
-
-    # strip [ ] from output
-    info_string = info_string.replace("[", "")
-    info_string = info_string.replace("]", "")
+    info_string = "{},{},{},{},{},{},{},{},{},{},{},{}\n".format(str(now), result.input_file_choice,
+                                                                 result.construction_time,
+                                                                 result.distanceToFeasibility,
+                                                                 result.feasibility_time,
+                                                                 result.best_distance,
+                                                                 result.improvement_time,
+                                                                 result.violations,
+                                                                 result.totalCost,
+                                                                 initialisation.searchType,
+                                                                 initialisation.improveType,
+                                                                 result.trace_file or "")
 
     outputCSV = open(filename_csv, "a")
     outputCSV.write(info_string)
     outputCSV.close()
 
 
-def compareResults():
+def compareResults(result):
     bestTTtxt = open(filename_bestTxt)
     bestDistanceToFeasibility = int(bestTTtxt.readline())
     bestViolations = int(bestTTtxt.readline())
@@ -160,13 +142,13 @@ def compareResults():
     bestTTtxt.close()
 
     new_best = False
-    if feasibility.best_distance < bestDistanceToFeasibility:
+    if result.best_distance < bestDistanceToFeasibility:
         new_best = True
-    elif feasibility.best_distance == bestDistanceToFeasibility:
-        if violations < bestViolations:
+    elif result.best_distance == bestDistanceToFeasibility:
+        if result.violations < bestViolations:
             new_best = True
-        elif violations == bestViolations:
-            if totalCost < bestTotalCost:
+        elif result.violations == bestViolations:
+            if result.totalCost < bestTotalCost:
                 new_best = True
 
     if new_best:
@@ -175,10 +157,18 @@ def compareResults():
         print("new best timetable, the old one has been replaced")
 
 
-output_solution(improve.best_tt)
-outputList, violations, totalCost = validate_solution()
-writeValidationToTxt()
-appendInfoToCSV()
-
-if not firstRun:
-    compareResults()
\ No newline at end of file
+def saveSolution(result):
+    """
+    saves the best timetable of the result to the solutions folder and validates it;
+    the validator output is stored in the result, the timetable is kept if it is a new best
+    """
+    if data.instance is not result.instance:
+        data.useInstance(result.instance)
+    setFilenames(result.name)
+    output_solution(result.best_tt)
+    result.outputList, result.violations, result.totalCost = validate_solution(result.best_tt)
+    writeValidationToTxt(result)
+    appendInfoToCSV(result)
+
+    if not firstRun:
+        compareResults(result)
@@ -0,0 +1,256 @@
+""" Curriculum-based course timetabling solver;
+    solves timetabling problems formulated in .ectt file format (http://tabu.diegm.uniud.it/ctt/)
+    Copyright (C) 2013  Stephan E. Becker
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+__author__ = 'Stephan Becker'
+
+import data
+
+# in-process port of validator.cc for the formulations UD1 and UD2;
+# validates a timetable of the current instance and produces the same report as the validator
+
+# weights of the soft constraints per formulation
+costs = {"UD1": {"MinWorkingDays": 5, "IsolatedLectures": 1, "RoomStability": 0},
+         "UD2": {"MinWorkingDays": data.MinWorkingDays, "IsolatedLectures": data.IsolatedLectures,
+                 "RoomStability": data.RoomStability}}
+
+
+class Validator:
+    def __init__(self, tt=None, formulation="UD2"):
+        """
+        reads the timetable tt (default: the current timetable) like validator.cc reads a solution file:
+        a course has at most one lecture per timeslot, a repeated lecture is skipped with a warning
+        """
+        if formulation not in costs:
+            raise ValueError("Unknown formulation (existing ones: " + " ".join(sorted(costs)) + ")")
+        self.formulation = formulation
+        self.MIN_WORKING_DAYS_COST = costs[formulation]["MinWorkingDays"]
+        self.ISOLATED_LECTURES_COST = costs[formulation]["IsolatedLectures"]
+        self.ROOM_STABILITY_COST = costs[formulation]["RoomStability"]
+
+        self.periodsPerDay = data.header.periods
+        self.warnings = []
+
+        # room of the lecture of the course in the timeslot, None if the course has no lecture
+        self.tt = [[None] * data.numberOfTimeslots for _ in data.courses]
+        for (room, ts), event in data.timetableItems(tt):
+            if event is None:
+                continue
+            if self.tt[event.index][ts] is not None:
+                day, period = data.convertTimeslotToDayPeriod(ts)
+                self.warnings.append("WARNING: Repeated entry: {} {} {} {} (entry skipped)".format(
+                    event.id, data.roomIndexToName[room], day, period))
+                continue
+            self.tt[event.index][ts] = room
+
+        self.updateRedundantData()
+        self.conflicts = data.conflictingCourses
+
+    def updateRedundantData(self):
+        """
+        computes the lectures per room and timeslot, per curriculum and timeslot,
+        the working days and the rooms used by each course
+        """
+        T = data.numberOfTimeslots
+        self.roomLectures = [[0] * T for _ in data.rooms]
+        self.curriculumPeriodLectures = [[0] * T for _ in data.curricula]
+        self.workingDays = []
+        self.usedRooms = []
+        self.coursePeriods = []
+
+        for c, row in enumerate(self.tt):
+            periods = [p for p in range(T) if row[p] is not None]
+            self.coursePeriods.append(periods)
+            for p in periods:
+                self.roomLectures[row[p]][p] += 1
+                for g in data.courseIndexToCurricula[c]:
+                    self.curriculumPeriodLectures[g][p] += 1
+            self.workingDays.append(len({p // self.periodsPerDay for p in periods}))
+            self.usedRooms.append(len({row[p] for p in periods}))
+
+    def lectureCount(self, c):
+        return len(self.coursePeriods[c])
+
+    def isolatedPeriods(self, g):
+        """
+        yields the timeslots of the curriculum g holding lectures without a lecture of g in an adjacent timeslot
+        """
+        ppd = self.periodsPerDay
+        lectures = self.curriculumPeriodLectures[g]
+        for p in range(data.numberOfTimeslots):
+            if lectures[p] > 0:
+                if p % ppd == 0:
+                    isolated = ppd == 1 or lectures[p + 1] == 0
+                elif p % ppd == ppd - 1:
+                    isolated = lectures[p - 1] == 0
+                else:
+                    isolated = lectures[p + 1] == 0 and lectures[p - 1] == 0
+                if isolated:
+                    yield p
+
+    def conflictingPeriods(self):
+        """
+        yields (c1, c2, p) for the courses c1 < c2 in conflict which both have a lecture in the timeslot p
+        """
+        for c1, c2 in self.conflicts:
+            row2 = self.tt[c2]
+            for p in self.coursePeriods[c1]:
+                if row2[p] is not None:
+                    yield c1, c2, p
+
+    def costsOnLectures(self):
+        return sum(abs(course.num_lectures - self.lectureCount(c)) for c, course in enumerate(data.courses))
+
+    def costsOnConflicts(self):
+        return sum(1 for _ in self.conflictingPeriods())
+
+    def costsOnAvailability(self):
+        T = data.numberOfTimeslots
+        return sum(1 for c, periods in enumerate(self.coursePeriods)
+                   for p in periods if not data.courseAvailability[c * T + p])
+
+    def costsOnRoomOccupation(self):
+        return sum(lectures - 1 for row in self.roomLectures for lectures in row if lectures > 1)
+
+    def costsOnRoomCapacity(self):
+        cost = 0
+        for c, course in enumerate(data.courses):
+            for p in self.coursePeriods[c]:
+                capacity = data.rooms[self.tt[c][p]].capacity
+                if capacity < course.num_students:
+                    cost += course.num_students - capacity
+        return cost
+
+    def costsOnMinWorkingDays(self):
+        return sum(max(0, course.minWorkingDays - self.workingDays[c]) for c, course in enumerate(data.courses))
+
+    def costsOnIsolatedLectures(self):
+        return sum(self.curriculumPeriodLectures[g][p]
+                   for g in range(len(data.curricula)) for p in self.isolatedPeriods(g))
+
+    def costsOnRoomStability(self):
+        return sum(rooms - 1 for rooms in self.usedRooms if rooms > 1)
+
+    def violations(self):
+        return self.costsOnLectures() + self.costsOnConflicts() + self.costsOnAvailability() + \
+            self.costsOnRoomOccupation()
+
+    def totalCost(self):
+        return self.costsOnRoomCapacity() + self.costsOnMinWorkingDays() * self.MIN_WORKING_DAYS_COST + \
+            self.costsOnIsolatedLectures() * self.ISOLATED_LECTURES_COST + \
+            self.costsOnRoomStability() * self.ROOM_STABILITY_COST
+
+    def periodString(self, p):
+        return "{} (day {}, timeslot {})".format(p, p // self.periodsPerDay, p % self.periodsPerDay)
+
+    def violationsOnLectures(self):
+        lines = []
+        for c, course in enumerate(data.courses):
+            if self.lectureCount(c) < course.num_lectures:
+                lines.append("[H] Too few lectures for course " + course.id)
+            elif self.lectureCount(c) > course.num_lectures:
+                lines.append("[H] Too many lectures for course " + course.id)
+        return lines
+
+    def violationsOnConflicts(self):
+        return ["[H] Courses {} and {} have both a lecture at period {}".format(
+            data.courses[c1].id, data.courses[c2].id, self.periodString(p)) for c1, c2, p in self.conflictingPeriods()]
+
+    def violationsOnAvailability(self):
+        T = data.numberOfTimeslots
+        return ["[H] Course {} has a lecture at unavailable period {}".format(course.id, self.periodString(p))
+                for c, course in enumerate(data.courses) for p in self.coursePeriods[c]
+                if not data.courseAvailability[c * T + p]]
+
+    def violationsOnRoomOccupation(self):
+        lines = []
+        for p in range(data.numberOfTimeslots):
+            for r, room in enumerate(data.rooms):
+                lectures = self.roomLectures[r][p]
+                if lectures > 1:
+                    line = "[H] {} lectures in room {} the period {}".format(lectures, room.id, self.periodString(p))
+                    if lectures > 2:
+                        line += " [{} violations]".format(lectures - 1)
+                    lines.append(line)
+        return lines
+
+    def violationsOnRoomCapacity(self):
+        lines = []
+        for c, course in enumerate(data.courses):
+            for p in self.coursePeriods[c]:
+                room = data.rooms[self.tt[c][p]]
+                if room.capacity < course.num_students:
+                    lines.append("[S({})] Room {} too small for course {} the period {}".format(
+                        course.num_students - room.capacity, room.id, course.id, self.periodString(p)))
+        return lines
+
+    def violationsOnMinWorkingDays(self):
+        return ["[S({})] The course {} has only {} days of lecture".format(
+            self.MIN_WORKING_DAYS_COST, course.id, self.workingDays[c])
+            for c, course in enumerate(data.courses) if self.workingDays[c] < course.minWorkingDays]
+
+    def violationsOnIsolatedLectures(self):
+        return ["[S({})] Curriculum {} has an isolated lecture at period {}".format(
+            self.ISOLATED_LECTURES_COST, cu.id, self.periodString(p))
+            for g, cu in enumerate(data.curricula) for p in self.isolatedPeriods(g)]
+
+    def violationsOnRoomStability(self):
+        return ["[S({})] Course {} uses {} different rooms".format(
+            (self.usedRooms[c] - 1) * self.ROOM_STABILITY_COST, course.id, self.usedRooms[c])
+            for c, course in enumerate(data.courses) if self.usedRooms[c] > 1]
+
+    def report(self):
+        """
+        returns the lines validator.cc prints: the violations, the costs per constraint and the summary
+        """
+        lines = self.violationsOnLectures() + self.violationsOnConflicts() + self.violationsOnAvailability() + \
+            self.violationsOnRoomOccupation() + self.violationsOnRoomCapacity() + self.violationsOnMinWorkingDays() + \
+            self.violationsOnIsolatedLectures()
+        if self.formulation == "UD2":
+            lines += self.violationsOnRoomStability()
+        lines.append("")
+
+        lines.append("Violations of Lectures (hard) : {}".format(self.costsOnLectures()))
+        lines.append("Violations of Conflicts (hard) : {}".format(self.costsOnConflicts()))
+        lines.append("Violations of Availability (hard) : {}".format(self.costsOnAvailability()))
+        lines.append("Violations of RoomOccupation (hard) : {}".format(self.costsOnRoomOccupation()))
+        lines.append("Cost of RoomCapacity (soft) : {}".format(self.costsOnRoomCapacity()))
+        lines.append("Cost of MinWorkingDays (soft) : {}".format(
+            self.costsOnMinWorkingDays() * self.MIN_WORKING_DAYS_COST))
+        lines.append("Cost of IsolatedLectures (soft) : {}".format(
+            self.costsOnIsolatedLectures() * self.ISOLATED_LECTURES_COST))
+        if self.formulation == "UD2":
+            lines.append("Cost of RoomStability (soft) : {}".format(
+                self.costsOnRoomStability() * self.ROOM_STABILITY_COST))
+        lines.append("")
+
+        if self.warnings:
+            lines.append("There are {} warnings!".format(len(self.warnings)))
+        summary = "Summary: "
+        if self.violations() > 0:
+            summary += "Violations = {}, ".format(self.violations())
+        lines.append(summary + "Total Cost = {}".format(self.totalCost()))
+        return lines
+
+
+def validate(tt=None, formulation="UD2"):
+    """
+    validates the timetable tt (default: the current timetable) of the current instance
+
+    returns the report as a list of lines, the number of violations and the total cost
+    """
+    validator = Validator(tt, formulation)
+    return validator.report(), validator.violations(), validator.totalCost()